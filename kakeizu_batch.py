@@ -0,0 +1,207 @@
+"""家系図PDFの一括生成（コマンドライン）
+
+    python kakeizu_batch.py clients/            # フォルダ内の *.txt を1件ずつ
+    python kakeizu_batch.py clients.jsonl -o out -j 8
+    python kakeizu_batch.py clients/ --metrics  # 段階・ページごとの計測を1行1件のJSONで標準エラーへ
+    python kakeizu_batch.py clients.jsonl --volume 20261017.pdf  # 全員分を目次付きの1冊にまとめる
+    python kakeizu_batch.py export.txt -o out   # 区切り行（---）で全員分を並べた書き出しファイル
+
+JSONL は1行1件で {"id": "...", "text": "..."}（id は省略可）。
+入力は1人分ずつ読んで解析するので、数万件のファイルでもメモリは一定で済む。
+ReportLab を読み込むのは描画するワーカー（--volume ではこのプロセス）だけで、読み込み・解析側は軽い。
+"""
+import argparse
+import datetime
+import io
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import kakeizu_core
+from kakeizu_core import (
+    Instrumentation,
+    client_display_name,
+    count_clients,
+    get_font_registry,
+    init_render_worker,
+    iter_clients,
+    pdf_file_name,
+    unique_path,
+)
+
+metrics_logger = logging.getLogger('kakeizu.metrics')
+
+# ==========================================
+# 1. 入力の読み込み
+# ==========================================
+def iter_sources(path, errors=None):
+    """(入力元ID, 行のイテラブル) を順に返す
+
+    フォルダは中の *.txt を1ファイルずつ、.txt ファイルは区切り行で全員分を並べた書き出しとして、
+    それ以外は JSONL として読む。JSONL の壊れた行は errors に (ID, メッセージ) を加えて飛ばす。
+    """
+    if os.path.isdir(path):
+        for entry in sorted(os.listdir(path)):
+            if entry.endswith('.txt'):
+                with open(os.path.join(path, entry), encoding='utf-8') as f:
+                    yield entry, f
+    elif path.endswith('.txt'):
+        with open(path, encoding='utf-8') as f:
+            yield os.path.basename(path), f
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                source_id = f"{os.path.basename(path)}:{line_no}"
+                try:
+                    record = json.loads(line)
+                    source_id = str(record.get('id', source_id))
+                    text = record['text']
+                    lines = io.StringIO(text)
+                except (json.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+                    if errors is not None:
+                        errors.append((source_id, f"読み込みエラー: {type(e).__name__}: {e}"))
+                    continue
+                yield source_id, lines
+
+def iter_source_clients(path, errors):
+    """(ID, ClientRecord) を1人分ずつ返す。解析の誤りは errors に (ID, メッセージ) を加えて飛ばす
+
+    1つの入力元に複数人いるときは、2人目以降の ID に開始行番号を付ける。
+    """
+    for source_id, lines in iter_sources(path, errors):
+        on_error = lambda e, source_id=source_id: errors.append((source_id, f"解析エラー: {e}"))
+        for index, (line_no, client_data) in enumerate(iter_clients(lines, on_error)):
+            yield (f"{source_id}:{line_no}" if index else source_id), client_data
+
+def count_sources(path):
+    """iter_source_clients が返す人数の上限（区切り行で数えるだけで、中身は解析しない）
+
+    JSONL も1行に区切り行で複数人が入っていることがあるので、行ではなく人数で数える。
+    """
+    return sum(count_clients(lines) for _, lines in iter_sources(path))
+
+# ==========================================
+# 2. ワーカー処理
+# ==========================================
+def _init_worker(metrics=False):
+    if metrics:
+        _configure_metrics_log()
+    fonts = init_render_worker()
+    if metrics and fonts.load_seconds is not None:
+        _metrics_hook(None)({'stage': 'font_load', 'page': None, 'seconds': fonts.load_seconds,
+                             'peak_kb': None, 'bytes': None})
+
+def _configure_metrics_log():
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stderr)
+
+def _metrics_hook(source_id):
+    """計測結果を1行1件のJSONとしてログに出すフック"""
+    def log_record(record):
+        metrics_logger.info(json.dumps({'source': source_id, 'pid': os.getpid(), **record}, ensure_ascii=False))
+    return log_record
+
+def _timed(iterable):
+    """要素ごとに、取り出すのにかかった秒数を添えて返す"""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        yield time.perf_counter() - start, item
+
+def _render_job(client_data, out_path, source_id, metrics=False):
+    instrument = None
+    if metrics:
+        instrument = Instrumentation(trace_memory=True)
+        instrument.subscribe(_metrics_hook(source_id))
+    start = time.perf_counter()
+    with open(out_path, 'wb') as f:
+        kakeizu_core.render_pdf(client_data, f, instrument)
+    return os.path.getsize(out_path), time.perf_counter() - start
+
+# ==========================================
+# 3. メイン処理
+# ==========================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="家系図PDFを一括生成する")
+    parser.add_argument('input', help="テキストファイルのフォルダ、区切り行で全員分を並べた .txt、または JSONL ファイル")
+    parser.add_argument('-o', '--out', default='.', help="出力先フォルダ（既定: カレント）")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="並列プロセス数（既定: CPUコア数）")
+    parser.add_argument('--metrics', action='store_true', help="段階・ページごとの計測をJSONログとして出力する")
+    parser.add_argument('--volume', metavar='FILE', help="全員分を目次・しおり付きの1つのPDFにまとめて FILE に書き出す")
+    args = parser.parse_args(argv)
+
+    if args.volume:
+        return write_volume(args.input, args.volume)
+
+    os.makedirs(args.out, exist_ok=True)
+    if args.metrics:
+        _configure_metrics_log()
+    today = datetime.datetime.now()
+    start = time.perf_counter()
+    errors = []
+    used_names = set()
+    done = 0
+    total_bytes = 0
+
+    def collect(futures):
+        nonlocal done, total_bytes
+        for future in futures:
+            source_id, out_path = pending.pop(future)
+            try:
+                size, seconds = future.result()
+            except Exception as e:
+                errors.append((source_id, f"生成エラー: {e}"))
+                continue
+            done += 1
+            total_bytes += size
+            print(f"OK  {source_id} -> {out_path} ({size / 1024:.0f} KB, {seconds:.2f}s)")
+
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker, initargs=(args.metrics,)) as pool:
+        # 読み込みが生成より先に進みすぎないよう、生成待ちはワーカー数の数倍までにする
+        pending = {}
+        for parse_seconds, (source_id, client_data) in _timed(iter_source_clients(args.input, errors)):
+            if args.metrics:
+                _metrics_hook(source_id)({'stage': 'parse_text_data', 'page': None, 'seconds': parse_seconds,
+                                          'peak_kb': None, 'bytes': None})
+            if len(pending) >= args.jobs * 4:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            file_name = pdf_file_name(client_display_name(client_data), today)
+            out_path = unique_path(args.out, file_name, used_names)
+            pending[pool.submit(_render_job, client_data, out_path, source_id, args.metrics)] = (source_id, out_path)
+        collect(wait(pending).done)
+
+    elapsed = time.perf_counter() - start
+    for source_id, message in errors:
+        print(f"NG  {source_id}: {message}", file=sys.stderr)
+    rate = done / elapsed if elapsed else 0.0
+    print(f"完了 {done}件 / エラー {len(errors)}件 / {elapsed:.1f}秒 "
+          f"({rate:.1f}件/秒, 合計 {total_bytes / 1024 / 1024:.1f} MB)")
+    return 1 if errors else 0
+
+def write_volume(input_path, out_path):
+    """1件ずつ解析しながら1冊のPDFに描く（全件をメモリに載せない）"""
+    start = time.perf_counter()
+    errors = []
+
+    clients = (client_data for _, client_data in iter_source_clients(input_path, errors))
+    get_font_registry().ensure()
+    with open(out_path, 'wb') as f:
+        done = kakeizu_core.render_volume(clients, f, count_sources(input_path))
+    elapsed = time.perf_counter() - start
+    for source_id, message in errors:
+        print(f"NG  {source_id}: {message}", file=sys.stderr)
+    rate = done / elapsed if elapsed else 0.0
+    print(f"完了 {done}件 / エラー {len(errors)}件 / {elapsed:.1f}秒 "
+          f"({rate:.1f}件/秒, {os.path.getsize(out_path) / 1024 / 1024:.1f} MB) -> {out_path}")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""家系図PDF生成のベンチマーク
+
+    python kakeizu_bench.py                    # 計測して基準値と比較（基準値がなければ表示のみ）
+    python kakeizu_bench.py --save-baseline    # 今回の結果を基準値として保存
+    python kakeizu_bench.py --threshold 0.2    # 基準値から20%以上遅い・大きいものを劣化とみなす
+
+データはすべて合成したもので、IPAフォントがなければ ReportLab 同梱の Vera.ttf で代用する
+（日本語の字形は入らないため、出力サイズは実フォントより小さくなる）。
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from kakeizu_core import (
+    GenealogyPDF,
+    ahnentafel_label,
+    get_font_registry,
+    parse_text_data,
+    render_pdf,
+    use_substitute_font,
+)
+
+DEFAULT_BASELINE = "bench_baseline.json"
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ==========================================
+# 1. 合成データ
+# ==========================================
+def synthetic_text(depth, contracts=4):
+    """depth 世代分の名前と、守護・優先順位・契約を持つ入力テキスト"""
+    people = range(1, 2 ** (depth + 1))
+    lines = [f"{ahnentafel_label(n)} = 山田{n}" for n in people]
+    lines.append("◎守護存在")
+    lines += [f"・{ahnentafel_label(n)}" for n in people if n % 3 == 0]
+    lines.append("◎優先順位")
+    lines += [f"・{ahnentafel_label(n)}" for n in people if n % 5 == 0]
+    lines.append("◎契約・コード")
+    lines += [f"・契約{i}「理由のない感情が突然出る」" for i in range(contracts)]
+    return "\n".join(lines)
+
+def synthetic_text_lines(num_lines):
+    """およそ num_lines 行の入力テキスト（名前は10世代まで、残りは契約）"""
+    depth = 1
+    while depth < 10 and synthetic_text(depth + 1).count("\n") < num_lines:
+        depth += 1
+    text = synthetic_text(depth)
+    remaining = max(0, num_lines - text.count("\n") - 1)
+    return synthetic_text(depth, contracts=4 + remaining)
+
+# ==========================================
+# 2. ベンチマーク項目
+# ==========================================
+def bench_parse(num_lines):
+    text = synthetic_text_lines(num_lines)
+    def run():
+        parse_text_data(text)
+        return None
+    return run
+
+def bench_page(depth, method):
+    data = parse_text_data(synthetic_text(depth))
+    def run():
+        buffer = io.BytesIO()
+        gen = GenealogyPDF(data, buffer)
+        getattr(gen, method)()
+        gen.save()
+        return len(buffer.getvalue())
+    return run
+
+def bench_quad_parallel(depth, pool):
+    data = parse_text_data(synthetic_text(depth))
+    def run():
+        buffer = io.BytesIO()
+        gen = GenealogyPDF(data, buffer, pool=pool)
+        gen.create_quad_pages()
+        gen.save()
+        return len(buffer.getvalue())
+    return run
+
+def bench_end_to_end(depth):
+    text = synthetic_text(depth)
+    def run():
+        buffer = io.BytesIO()
+        render_pdf(parse_text_data(text), buffer)
+        return len(buffer.getvalue())
+    return run
+
+def bench_startup(statement):
+    """新しいプロセスで statement を実行し終えるまで（インタプリタの起動と読み込みを含む）"""
+    def run():
+        subprocess.run([sys.executable, '-c', statement], cwd=APP_DIR, check=True)
+        return None
+    return run
+
+def bench_app_rerun():
+    """Streamlit アプリの再実行1回分（入力欄を操作したときと同じ）"""
+    app = None
+    def run():
+        nonlocal app
+        if app is None:
+            from streamlit.testing.v1 import AppTest
+            app = AppTest.from_file(os.path.join(APP_DIR, 'kakeizu.py'), default_timeout=30)
+        app.run()
+        return None
+    return run
+
+def benchmark_cases(pool=None):
+    cases = {}
+    for num_lines in (30, 300, 1000, 10000):
+        cases[f"parse_{num_lines}_lines"] = bench_parse(num_lines)
+    for depth in range(4, 9):
+        cases[f"tree_page_gen{depth}"] = bench_page(depth, 'create_tree_page')
+    for depth in (4, 6, 8):
+        cases[f"quad_pages_gen{depth}"] = bench_page(depth, 'create_quad_pages')
+    if pool is not None:
+        for depth in (7, 8):
+            cases[f"quad_pages_gen{depth}_parallel"] = bench_quad_parallel(depth, pool)
+    for depth in (4, 6, 8):
+        cases[f"end_to_end_gen{depth}"] = bench_end_to_end(depth)
+    cases["startup_parse"] = bench_startup("import kakeizu_core; kakeizu_core.parse_text_data('本人 = 山田')")
+    cases["startup_app"] = bench_startup("import kakeizu")
+    cases["app_rerun"] = bench_app_rerun()
+    return cases
+
+def measure(run, repeat):
+    """repeat 回実行して中央値の秒数と出力バイト数を返す"""
+    times = []
+    size = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = run()
+        times.append(time.perf_counter() - start)
+    return {'seconds': statistics.median(times), 'bytes': size}
+
+# ==========================================
+# 3. 基準値との比較
+# ==========================================
+def compare(results, baseline, threshold):
+    """基準値より threshold の割合以上 遅い・大きい項目を返す"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in ('seconds', 'bytes'):
+            if result[metric] is None or not base.get(metric):
+                continue
+            ratio = result[metric] / base[metric]
+            if ratio > 1 + threshold:
+                regressions.append((name, metric, base[metric], result[metric], ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="家系図PDF生成のベンチマーク")
+    parser.add_argument('-k', '--filter', default='', help="名前にこの文字列を含む項目だけ実行する")
+    parser.add_argument('-r', '--repeat', type=int, default=5, help="各項目の実行回数（中央値を採る）")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="基準値ファイル")
+    parser.add_argument('--save-baseline', action='store_true', help="今回の結果を基準値として保存する")
+    parser.add_argument('--threshold', type=float, default=0.25, help="劣化とみなす増加率（既定 0.25 = 25%%）")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help="4分割ページの並列描画に使うプロセス数（既定: CPUコア数、1 で並列の項目を省く）")
+    args = parser.parse_args(argv)
+
+    use_substitute_font()
+    fonts = get_font_registry()
+    print(f"フォント: {fonts.path}（読み込み {fonts.load_seconds:.3f}秒）")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    pool = ProcessPoolExecutor(max_workers=args.jobs, initializer=use_substitute_font) if args.jobs > 1 else None
+    results = {}
+    for name, run in benchmark_cases(pool).items():
+        if args.filter not in name:
+            continue
+        run() # 初回のみのコスト（フォントのサブセット準備など）を除く
+        results[name] = measure(run, args.repeat)
+        result = results[name]
+        size = f"{result['bytes'] / 1024:9.1f} KB" if result['bytes'] is not None else " " * 12
+        base = baseline.get(name, {}).get('seconds')
+        diff = f"  ({(result['seconds'] / base - 1) * 100:+.0f}%)" if base else ""
+        print(f"{name:24s} {result['seconds'] * 1000:10.2f} ms {size}{diff}")
+    if pool is not None:
+        pool.shutdown()
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        print(f"基準値を保存しました: {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for name, metric, before, after, ratio in regressions:
+        print(f"劣化 {name} {metric}: {before:.4g} -> {after:.4g} ({(ratio - 1) * 100:+.0f}%)", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""家系図PDF生成の中核（画面・コマンドラインから使う部分）
+
+    settings    設定値（フォントファイル名・キャッシュの大きさなど）
+    records     関係の番号付けと1人分のデータ（ClientRecord）
+    parser      入力テキストの解析
+    layout      家系図のレイアウトとSVGプレビュー
+    fonts       フォントの管理
+    instrument  生成処理の計測
+    render      PDFの描画
+    cache       生成済みPDF・ページ記録のキャッシュ
+
+layout と render の名前は初めて使われたときに読み込む。解析やキャッシュの確認だけなら
+ReportLab は読み込まれない（Streamlit の再実行やバッチの読み込み側を軽くするため）。
+"""
+import importlib
+
+from .cache import PageCache, PDFCache, get_pdf_cache
+from .fonts import FontRegistry, get_font_registry, init_render_worker, use_substitute_font
+from .instrument import Instrumentation
+from .parser import (
+    ParseError,
+    client_data_digest,
+    count_clients,
+    is_client_separator,
+    iter_clients,
+    parse_text_data,
+)
+from .records import (
+    GUARDIAN,
+    PRIORITY,
+    RELATION_KEYS,
+    RELATION_LABELS,
+    RELATION_MAP,
+    RELATION_NUMBERS,
+    ClientRecord,
+    ahnentafel_gender,
+    ahnentafel_key,
+    ahnentafel_label,
+    client_display_name,
+    pdf_file_name,
+    quad_page_count,
+    tree_sheets,
+    unique_path,
+)
+from .settings import (
+    FONT_FALLBACK_FILE,
+    FONT_FILE,
+    FONT_NAME,
+    FONT_SIZE_BG,
+    FONT_SIZE_QUAD_NAME,
+    FONT_SIZE_SUMMARY,
+    FONT_SIZE_TREE,
+    MAX_GENERATION,
+    NO_LINE_START,
+    PDF_CACHE_DIR,
+    PDF_CACHE_DISK_BYTES,
+    PDF_CACHE_MAX_ITEM_BYTES,
+    PDF_CACHE_MEMORY_BYTES,
+    PDF_INVARIANT,
+    QUAD_PARALLEL_MIN_PAGES,
+    QUAD_RANGE_PAGES,
+    RENDERER_VERSION,
+    SUMMARY_LIST_ROWS,
+    TREE_GENERATIONS,
+    VOLUME_TOC_ROWS,
+)
+
+# 使われたときに読み込むモジュール → そこから公開する名前
+_LAZY_EXPORTS = {
+    'layout': ('MIN_COUPLE_SLOT', 'TreeLayoutConfig', 'sheet_generations', 'tree_layout_config',
+               'tree_legend', 'tree_node_style', 'tree_sheet_layout', 'tree_sheet_svg'),
+    'render': ('GenealogyPDF', 'char_width', 'copy_font_state', 'render_pdf', 'render_volume',
+               'restore_font_state', 'wrap_text'),
+}
+_LAZY_MODULES = {name: module for module, names in _LAZY_EXPORTS.items() for name in names}
+
+
+def __getattr__(name):
+    module = _LAZY_MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value # 2回目からは普通の属性として引く
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_MODULES))
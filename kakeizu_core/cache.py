@@ -0,0 +1,205 @@
+"""生成済みPDFとページ記録のキャッシュ"""
+import functools
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+from .fonts import get_font_registry
+from .parser import client_data_digest
+from .settings import (
+    FONT_NAME,
+    PDF_CACHE_DIR,
+    PDF_CACHE_DISK_BYTES,
+    PDF_CACHE_MAX_ITEM_BYTES,
+    PDF_CACHE_MEMORY_BYTES,
+    RENDERER_VERSION,
+)
+
+class PDFCache:
+    """正規化した入力データ＋描画/フォントのバージョン → PDF。メモリLRUと任意のディスク保存の2段
+
+    メモリ側は合計バイト数で上限をかけ、PDF_CACHE_MAX_ITEM_BYTES を超えるPDFはディスク側にだけ置く。
+    """
+    def __init__(self, memory_bytes=PDF_CACHE_MEMORY_BYTES, disk_dir=None, disk_max_bytes=PDF_CACHE_DISK_BYTES):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def key(self, client_data):
+        fonts = get_font_registry()
+        fonts.locate()
+        source = json.dumps([RENDERER_VERSION, fonts.fingerprint, client_data_digest(client_data)])
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+    def open(self, key, count=True):
+        """キャッシュにあれば先頭から読めるファイルオブジェクトを返す。なければ None（count=False ならヒット数に数えない）"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += count
+                return io.BytesIO(self._memory[key])
+        f = self._open_disk(key)
+        with self._lock:
+            if f is None:
+                self.misses += count
+                return None
+            self.disk_hits += count
+        if os.fstat(f.fileno()).st_size <= PDF_CACHE_MAX_ITEM_BYTES:
+            with f:
+                data = f.read()
+            self._remember(key, data)
+            return io.BytesIO(data)
+        return f
+
+    def put(self, key, file_object):
+        """生成したPDF（先頭から読める file_object）を保存する。保存後は先頭に戻す"""
+        file_object.seek(0, os.SEEK_END)
+        size = file_object.tell()
+        file_object.seek(0)
+        if size <= PDF_CACHE_MAX_ITEM_BYTES:
+            self._remember(key, file_object.read())
+            file_object.seek(0)
+        if self.disk_dir:
+            self._write_disk(key, file_object)
+            file_object.seek(0)
+
+    def stats(self):
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'items': len(self._memory), 'memory_bytes': self._memory_size}
+
+    def _remember(self, key, data):
+        with self._lock:
+            if key in self._memory:
+                self._memory_size -= len(self._memory.pop(key))
+            self._memory[key] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+                _, old = self._memory.popitem(last=False)
+                self._memory_size -= len(old)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.pdf")
+
+    def _open_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        os.utime(path) # 最終利用日時を更新（古いものから消すため）
+        return f
+
+    def _write_disk(self, key, file_object):
+        tmp_path = f"{self._disk_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(file_object, f)
+        os.replace(tmp_path, self._disk_path(key))
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """合計サイズが上限を超えたら、最後に使われたのが古いものから削除する"""
+        entries = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+@functools.lru_cache(maxsize=None)
+def get_pdf_cache():
+    """プロセス内で共通のPDFキャッシュ（Streamlit では全セッション共通）"""
+    return PDFCache(disk_dir=PDF_CACHE_DIR)
+
+
+class PageCache:
+    """1人分の文書をページ単位で記録しておき、作り直すときに入力が変わらなかったページを再生する
+
+    ページは「そのページが使うデータだけの組」（4分割なら4名の名前と属性）をキーにする。
+    ReportLab は TrueType の文字コードを文書ごとに使われた順に割り当てるため、記録した描画命令は
+    その割り当てのもとでしか正しくない。そこで割り当て表も持ち越し、次の文書はそれを引き継いで始める。
+    割り当ては増える一方なので、使われなくなった文字が増えすぎたら作り直す。
+    attach / detach は描画するプロセスでだけ呼ばれるので、ReportLab はそこで読み込む
+    （画面側は結果の stats() を見るだけ）。
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.identity = None
+        self.font_state = None # (assignments, subsets, nextCode)
+        self.font_name = None
+        self.base_glyphs = 0
+        self.reused = 0
+        self.rendered = 0
+        self._pages = {}
+        self._used = {}
+
+    def attach(self, c, page_size):
+        """新しい文書 c の描画前に呼ぶ。前回の文字コードの割り当てを引き継がせる"""
+        from reportlab.pdfbase import pdfmetrics
+        from .render import restore_font_state
+        fonts = get_font_registry()
+        identity = (RENDERER_VERSION, fonts.fingerprint, tuple(page_size))
+        if identity != self.identity or (
+                self.font_state and len(self.font_state[0]) > self.base_glyphs * 1.5 + 64):
+            self.clear()
+            self.identity = identity
+        font = pdfmetrics.getFont(FONT_NAME)
+        if self.font_state is not None:
+            restore_font_state(c._doc, self.font_state)
+        # 記録した描画命令の中のフォント名（/F2+0 など）が変わらないよう、最初に登録しておく
+        font_name = font.getSubsetInternalName(0, c._doc)
+        if font_name != self.font_name:
+            self._pages.clear()
+            self.font_name = font_name
+        self.reused = self.rendered = 0
+        self._used = {}
+
+    def __contains__(self, unit):
+        return unit in self._pages
+
+    def get(self, unit):
+        pages = self._pages.get(unit)
+        if pages is not None:
+            self._used[unit] = pages
+            self.reused += len(pages)
+        return pages
+
+    def put(self, unit, pages):
+        self._used[unit] = pages
+        self.rendered += len(pages)
+
+    def detach(self, c):
+        """文書 c を書き出す直前に呼ぶ。今回使ったページと文字コードの割り当てだけを残す"""
+        from .render import copy_font_state
+        font_state = copy_font_state(c._doc)
+        if self.font_state is None:
+            self.base_glyphs = len(font_state[0])
+        self.font_state = font_state
+        self._pages = self._used
+
+    def stats(self):
+        return {'reused': self.reused, 'rendered': self.rendered}
@@ -0,0 +1,69 @@
+"""フォントの管理。ReportLab への登録は PDF を描くときまで行わない"""
+import functools
+import os
+import threading
+import time
+
+from .settings import FONT_FALLBACK_FILE, FONT_FILE, FONT_NAME
+
+class FontRegistry:
+    """フォントをプロセス内で一度だけ読み込み、以降のPDFで使い回す"""
+    def __init__(self, font_name=FONT_NAME, candidates=(FONT_FILE, FONT_FALLBACK_FILE)):
+        self.font_name = font_name
+        self.candidates = candidates
+        self.path = None
+        self.load_seconds = None # ReportLab に登録するまでは None
+        self.fingerprint = None
+        self._lock = threading.Lock()
+
+    def locate(self):
+        """候補ファイルから使うフォントを決めて path と fingerprint を埋める。ReportLab は読み込まない"""
+        if self.path:
+            return self.path
+        for path in self.candidates:
+            if not os.path.exists(path):
+                continue
+            stat = os.stat(path)
+            self.fingerprint = f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+            self.path = path
+            return path
+        raise FileNotFoundError(f"{self.font_name} のフォントファイル ({FONT_FILE}) が見つかりません。")
+
+    def ensure(self):
+        """未登録なら ReportLab に登録する。登録済みなら何もしない"""
+        if self.load_seconds is not None:
+            return self.path
+        with self._lock:
+            if self.load_seconds is not None:
+                return self.path
+            path = self.locate()
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfbase.ttfonts import TTFont
+            start = time.perf_counter()
+            pdfmetrics.registerFont(TTFont(self.font_name, path))
+            self.load_seconds = time.perf_counter() - start
+            return path
+
+
+@functools.lru_cache(maxsize=None)
+def get_font_registry():
+    """プロセス内で共通のフォントレジストリ（Streamlit では全セッション共通）"""
+    return FontRegistry()
+
+def use_substitute_font():
+    """IPAフォントがなければ ReportLab 付属の Vera.ttf で代用する（テスト・計測用。日本語の字形はない）
+
+    プロセスプールの初期化にも使う。
+    """
+    import reportlab
+    fonts = get_font_registry()
+    substitute = os.path.join(os.path.dirname(reportlab.__file__), 'fonts', 'Vera.ttf')
+    fonts.candidates = (FONT_FILE, FONT_FALLBACK_FILE, substitute)
+    fonts.ensure()
+    return fonts
+
+def init_render_worker():
+    """PDFを描くワーカープロセスの初期化。フォントはワーカーごとに一度だけ読み込む"""
+    fonts = get_font_registry()
+    fonts.ensure()
+    return fonts
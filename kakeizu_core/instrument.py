@@ -0,0 +1,86 @@
+"""生成処理の計測"""
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+class Instrumentation:
+    """生成処理の段階ごと・ページごとに処理時間、メモリ使用量のピーク、出力バイト数を記録する
+
+    記録は records に溜まり、subscribe() で登録したフックにも1件ずつ渡される。
+    """
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.records = []
+        self._hooks = []
+        self._stage = None
+        self._page_start = None
+        self._stage_peak = 0
+
+    def subscribe(self, hook):
+        """hook(record) を記録のたびに呼ぶ"""
+        self._hooks.append(hook)
+
+    @contextmanager
+    def stage(self, name, output=None):
+        """name の段階を計測する。output（書き出し先）を渡すと tell() の差を出力バイト数とする"""
+        start_pos = _tell(output)
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self._stage, self._stage_peak = name, 0
+        start = self._page_start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            end_pos = _tell(output)
+            self._emit({
+                'stage': name,
+                'page': None,
+                'seconds': time.perf_counter() - start,
+                'peak_kb': self._take_peak(),
+                'bytes': end_pos - start_pos if start_pos is not None and end_pos is not None else None,
+            })
+            if started_tracing:
+                tracemalloc.stop()
+            self._stage = None
+
+    def add(self, name, seconds):
+        """計測の外で測った時間（ワーカー起動時のフォント読み込みなど）を1件の記録として加える"""
+        self._emit({'stage': name, 'page': None, 'seconds': seconds, 'peak_kb': None, 'bytes': None})
+
+    def page_done(self, page):
+        """段階内で1ページ描き終えたときに呼ぶ（ページの内容はPDF保存時にまとめて書き出される）"""
+        if self._stage is None:
+            return
+        now = time.perf_counter()
+        self._emit({
+            'stage': self._stage,
+            'page': page,
+            'seconds': now - self._page_start,
+            'peak_kb': self._take_peak(reset=True),
+            'bytes': None,
+        })
+        self._page_start = now
+
+    def _take_peak(self, reset=False):
+        if not (self.trace_memory and tracemalloc.is_tracing()):
+            return None
+        peak = tracemalloc.get_traced_memory()[1]
+        self._stage_peak = max(self._stage_peak, peak)
+        if reset:
+            tracemalloc.reset_peak()
+            return round(peak / 1024, 1)
+        return round(self._stage_peak / 1024, 1)
+
+    def _emit(self, record):
+        self.records.append(record)
+        for hook in self._hooks:
+            hook(record)
+
+def _tell(file_object):
+    try:
+        return file_object.tell() if file_object is not None else None
+    except (AttributeError, OSError):
+        return None
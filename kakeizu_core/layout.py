@@ -0,0 +1,129 @@
+"""家系図のレイアウト（座標表）と、入力確認用のSVGプレビュー
+
+ReportLab からは用紙の大きさと単位だけを使う（PDFを描く部分は読み込まない）。
+"""
+import functools
+import html
+from collections import namedtuple
+
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.units import mm
+
+from .records import RELATION_LABELS, ahnentafel_gender, tree_sheets
+from .settings import FONT_SIZE_TREE
+
+# 用紙・余白・枠の大きさ。座標はこれと層数だけで決まり、クライアントのデータには依存しない
+TreeLayoutConfig = namedtuple('TreeLayoutConfig', [
+    'page_size', 'margin_x', 'margin_top', 'margin_bottom',
+    'box_w', 'box_h', 'couple_spacing', 'bracket_drop',
+], defaults=[landscape(A4), 15 * mm, 40 * mm, 25 * mm, 8 * mm, 24 * mm, 14 * mm, 5 * mm])
+
+# 最上段の夫婦1組に最低限必要な幅（A4横で8組＝4世代が1枚に収まる）
+MIN_COUPLE_SLOT = 33 * mm
+
+def tree_layout_config(page_size=None):
+    """page_size（A3 や独自の大きさ）用の設定。余白・枠は既定のまま"""
+    return TreeLayoutConfig(page_size=tuple(page_size or landscape(A4)))
+
+def sheet_generations(config):
+    """1枚に載せられる世代数（最上段の夫婦が MIN_COUPLE_SLOT 以上の幅を取れる範囲）"""
+    couples = (config.page_size[0] - 2 * config.margin_x) // MIN_COUPLE_SLOT
+    generations = 1
+    while 2 ** generations <= couples:
+        generations += 1
+    return generations
+
+@functools.lru_cache(maxsize=64)
+def tree_sheet_layout(layers, config=TreeLayoutConfig()):
+    """1枚分の座標表 (nodes, segments) を返す（設定と層数ごとに1度だけ計算する）
+
+    nodes は (層, 層内の位置, x, y)。シートの最下段が番号 root の人物なら、
+    その人物の番号は (root << 層) + 層内の位置 になる。
+    segments は親子をつなぐ線分 (x1, y1, x2, y2)。
+    """
+    width, height = config.page_size
+    margin_y_top = height - config.margin_top
+    box_h_half = config.box_h / 2
+    layer_height = (margin_y_top - config.margin_bottom) / layers
+    
+    # 最上段：夫婦ごとの枠に右から順に並べる（父方が右）
+    coords = {}
+    num_couples = 1 << (layers - 1)
+    slot_width = (width - 2 * config.margin_x) / num_couples
+    top_y = config.margin_bottom + layer_height * layers
+    for i in range(num_couples):
+        slot_center_x = (width - config.margin_x) - (i * slot_width) - (slot_width / 2)
+        coords[(layers, 2*i)] = (slot_center_x + config.couple_spacing/2, top_y)
+        coords[(layers, 2*i + 1)] = (slot_center_x - config.couple_spacing/2, top_y)
+    
+    # 下の層：両親の中点（位置 i の両親は上の層の 2i と 2i+1）
+    segments = []
+    for layer in range(layers - 1, -1, -1):
+        y = config.margin_bottom + layer_height * layer
+        for i in range(1 << layer):
+            (fx, fy), (mx, my) = coords[(layer + 1, 2*i)], coords[(layer + 1, 2*i + 1)]
+            cx = (fx + mx) / 2
+            coords[(layer, i)] = (cx, y)
+            bar_y = fy - box_h_half - config.bracket_drop
+            segments += [
+                (fx, fy - box_h_half, fx, bar_y),
+                (mx, my - box_h_half, mx, bar_y),
+                (fx, bar_y, mx, bar_y),
+                (cx, bar_y, cx, y + box_h_half),
+            ]
+    nodes = tuple((layer, i, x, y) for (layer, i), (x, y) in coords.items())
+    return nodes, tuple(segments)
+
+def tree_legend(root):
+    """番号 root の人物から始まるシートの凡例（1行ずつ）"""
+    lines = ["◎ 太字 ＝ 供養の優先順位の高いご先祖様", "◎ 左傍線 ＝ 守護してくださるご先祖様"]
+    if root != 1:
+        lines.append(f"◎ {RELATION_LABELS[root]} から先の家系（続き）")
+    return lines
+
+def tree_node_style(n, record):
+    """家系図の枠1つ分の (表示名, 性別, 守護, 優先順位)。PDFとプレビューで共通"""
+    name = record.name(n) or RELATION_LABELS[n]
+    return (name, ahnentafel_gender(n)) + record.flags_of(n)
+
+def tree_sheet_svg(client_data, root=1, page_size=None):
+    """家系図のシート1枚（番号 root の人物が最下段）をSVG文字列で返す。入力確認のプレビュー用
+
+    座標表・表示名・属性は create_tree_page と同じものを使う。文字はブラウザのフォントで描く。
+    """
+    config = tree_layout_config(page_size)
+    width, height = config.page_size
+    layers = dict(tree_sheets(client_data.depth, sheet_generations(config)))[root]
+    nodes, segments = tree_sheet_layout(layers, config)
+    box_w, box_h = config.box_w, config.box_h
+    size = FONT_SIZE_TREE
+    char_height = size * 1.05
+
+    # SVG は y軸が下向きなので、PDFの座標を height - y に直して書く
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width:.0f} {height:.0f}" '
+             f'font-family="serif"><rect width="100%" height="100%" fill="white"/>']
+    for row, line in enumerate(tree_legend(root)):
+        parts.append(f'<text x="{config.margin_x:.1f}" y="{15 * mm + row * 6 * mm:.1f}" font-size="10">'
+                     f'{html.escape(line)}</text>')
+    path = "".join(f"M{x1:.1f} {height - y1:.1f}L{x2:.1f} {height - y2:.1f}" for x1, y1, x2, y2 in segments)
+    parts.append(f'<path d="{path}" stroke="black" stroke-width="0.6" fill="none"/>')
+    for layer, i, x, y in nodes:
+        name, gender, is_guardian, is_priority = tree_node_style((root << layer) + i, client_data)
+        y = height - y
+        if gender == 'f':
+            parts.append(f'<ellipse cx="{x:.1f}" cy="{y:.1f}" rx="{box_w / 2:.1f}" ry="{box_h / 2:.1f}" '
+                         f'fill="white" stroke="black" stroke-width="0.6"/>')
+        else:
+            parts.append(f'<rect x="{x - box_w / 2:.1f}" y="{y - box_h / 2:.1f}" width="{box_w:.1f}" '
+                         f'height="{box_h:.1f}" fill="white" stroke="black" stroke-width="0.6"/>')
+        top = y - len(name) * char_height / 2
+        if is_guardian:
+            line_x = x - size * 0.8
+            parts.append(f'<line x1="{line_x:.1f}" y1="{top - size * 0.2:.1f}" x2="{line_x:.1f}" '
+                         f'y2="{top + len(name) * char_height + size * 0.2:.1f}" stroke="black" stroke-width="0.5"/>')
+        weight = ' font-weight="bold"' if is_priority else ''
+        chars = "".join(f'<tspan x="{x:.1f}" y="{top + size + k * char_height:.1f}">{html.escape(char)}</tspan>'
+                        for k, char in enumerate(name))
+        parts.append(f'<text font-size="{size}" text-anchor="middle"{weight}>{chars}</text>')
+    parts.append('</svg>')
+    return "".join(parts)
@@ -0,0 +1,139 @@
+"""入力テキストの解析"""
+import hashlib
+import io
+import json
+
+from .records import GUARDIAN, PRIORITY, RELATION_NUMBERS, ClientRecord
+from .settings import MAX_GENERATION
+
+class ParseError(ValueError):
+    """入力の誤り。line_no は入力の先頭からの行番号（1始まり。JSON など行のない入力では None）"""
+    def __init__(self, line_no, message):
+        super().__init__(f"{line_no}行目: {message}" if line_no else message)
+        self.line_no = line_no
+
+def is_client_separator(line):
+    """複数クライアントをまとめたファイルの区切り行（ハイフン3つ以上だけの行）か"""
+    line = line.strip()
+    return len(line) >= 3 and not line.strip('-')
+
+def iter_clients(lines, on_error=None):
+    """行のイテラブル（開いたファイルなど）を1行ずつ読み、1人分ずつ (開始行番号, ClientRecord) を返す
+
+    クライアントの間は区切り行（---）で分ける。全体を読み込まないので、大きなファイルでも
+    メモリは1人分で済む。誤りは ParseError で知らせる。on_error を渡すと例外にせず
+    on_error(ParseError) を呼び、そのクライアントを飛ばして次の区切りから読み続ける。
+    """
+    builder = None
+    skipping = False
+    for line_no, line in enumerate(lines, 1):
+        line = line.replace('　', ' ').replace('*', '').strip()
+        if not line:
+            continue
+        if line[0] == '-' and is_client_separator(line):
+            if builder is not None and not skipping:
+                yield builder.start, builder.build()
+            builder = None
+            skipping = False
+            continue
+        if skipping:
+            continue
+        if builder is None:
+            builder = _ClientBuilder(line_no)
+        try:
+            builder.add_line(line, line_no)
+        except ParseError as e:
+            if on_error is None:
+                raise
+            on_error(e)
+            skipping = True
+    if builder is not None and not skipping:
+        yield builder.start, builder.build()
+
+def count_clients(lines):
+    """iter_clients が返す人数の目安（区切り行で数えるだけで、中身は解析しない）"""
+    count = 0
+    has_content = False
+    for line in lines:
+        if is_client_separator(line):
+            count += has_content
+            has_content = False
+        elif line.strip():
+            has_content = True
+    return count + has_content
+
+def parse_text_data(text):
+    """入力欄の形式のテキスト（1人分）を ClientRecord にする"""
+    clients = iter_clients(io.StringIO(text))
+    first = next(clients, None)
+    second = next(clients, None)
+    if second is not None:
+        raise ParseError(second[0], "区切り行（---）の後に2人目のデータがあります。1人分ずつ入力してください")
+    return first[1] if first else ClientRecord()
+
+def client_data_digest(client_data):
+    """解析済みデータ（ClientRecord）の内容のハッシュ"""
+    source = json.dumps(client_data.to_dict(), ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+# 見出し行 → 項目の種類
+SECTION_MARKERS = (('◎守護', 'guardians'), ('◎優先順位', 'priorities'), ('◎契約', 'contracts'))
+SECTION_FLAGS = {'guardians': GUARDIAN, 'priorities': PRIORITY}
+RELATION_CHARS = frozenset('父母の')
+
+class _ClientBuilder:
+    """1人分の行を受け取って ClientRecord を組み立てる"""
+    def __init__(self, start=None):
+        self.start = start
+        self.section = 'names'
+        self.names = {}
+        self.other_names = []
+        self.flags = {}
+        self.items = {'guardians': [], 'priorities': [], 'contracts': []}
+
+    def add_line(self, line, line_no=None):
+        """前後の空白を除いた空でない1行を受け取る"""
+        if line[0] == '◎':
+            for marker, section in SECTION_MARKERS:
+                if line.startswith(marker):
+                    self.section = section
+                    return
+        if self.section == 'names':
+            line = line.replace('＝', '=')
+            if '=' in line:
+                key, name = line.split('=', 1)
+                self.add_name(key.strip(), name.strip(), line_no)
+        else:
+            if line[0] == '・':
+                line = line[1:].strip()
+            self.add_item(self.section, line)
+
+    def add_name(self, key, name, line_no=None):
+        # 見出しはラベル（父の母）でも関係キー（fm）でもよい
+        n = _relation_number(key, line_no)
+        if n is None:
+            self.other_names.append((key, name))
+        else:
+            self.names[n] = name
+
+    def add_item(self, section, item):
+        self.items[section].append(item)
+        if section in SECTION_FLAGS:
+            # 項目は記録ページにそのまま載るので、関係として読めなくても誤りにはしない
+            n = RELATION_NUMBERS.get("".join(item.split()))
+            if n is not None:
+                self.flags[n] = self.flags.get(n, 0) | SECTION_FLAGS[section]
+
+    def build(self):
+        size = max(self.names.keys() | self.flags.keys(), default=0) + 1
+        return ClientRecord(names=(self.names.get(n) for n in range(size)),
+                            flags=(self.flags.get(n, 0) for n in range(size)),
+                            other_names=self.other_names, **self.items)
+
+def _relation_number(text, line_no=None):
+    """名前の見出し → 番号。関係でない見出しは None、関係の形なのに読めないもの（名前が載らなくなる）は ParseError"""
+    clean = "".join(text.split())
+    n = RELATION_NUMBERS.get(clean)
+    if n is None and clean and RELATION_CHARS.issuperset(clean):
+        raise ParseError(line_no, f"「{text}」は関係として読めません（{MAX_GENERATION}世代前までを「父の母」の形で書いてください）")
+    return n
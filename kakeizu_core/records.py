@@ -0,0 +1,147 @@
+"""関係の番号付け（アーネンタフェル番号）と1人分のデータ"""
+import datetime
+import os
+
+from .settings import MAX_GENERATION, TREE_GENERATIONS
+
+# 関係性はアーネンタフェル番号で表す：本人=1、番号 n の父=2n、母=2n+1
+def ahnentafel_key(n):
+    """番号 → 関係キー（1='self', 2='father', 3='mother', 4='ff', 5='fm', ...）"""
+    if n == 1:
+        return 'self'
+    if n <= 3:
+        return ('father', 'mother')[n - 2]
+    return format(n, 'b')[1:].replace('0', 'f').replace('1', 'm')
+
+def ahnentafel_label(n):
+    """番号 → 表示ラベル（'本人', '父', '父の母', ...）"""
+    if n == 1:
+        return '本人'
+    return 'の'.join('父' if bit == '0' else '母' for bit in format(n, 'b')[1:])
+
+def ahnentafel_gender(n):
+    """番号 → 性別（父方の番号は偶数、母方は奇数。本人は 'm' として扱う）"""
+    return 'f' if n > 1 and n % 2 else 'm'
+
+def _build_relation_map(max_generation):
+    """本人から max_generation 世代前までの関係表を番号順に作る"""
+    relation_map = {}
+    for n in range(1, 2 ** (max_generation + 1)):
+        gen = n.bit_length() - 1
+        entry = {'n': n, 'gen': gen, 'label': ahnentafel_label(n), 'gender': ahnentafel_gender(n)}
+        if gen < max_generation:
+            entry['p_father'] = ahnentafel_key(2 * n)
+            entry['p_mother'] = ahnentafel_key(2 * n + 1)
+        relation_map[ahnentafel_key(n)] = entry
+    return relation_map
+
+# 関係性マップ
+RELATION_MAP = _build_relation_map(MAX_GENERATION)
+
+# 入力に書かれた関係の表記（ラベル・関係キー）→ 番号
+RELATION_NUMBERS = {**{k: v['n'] for k, v in RELATION_MAP.items()}, **{v['label']: v['n'] for v in RELATION_MAP.values()}}
+
+# 番号を添字にした関係キー・表示ラベル（0 は未使用）
+RELATION_KEYS = (None,) + tuple(RELATION_MAP)
+RELATION_LABELS = (None,) + tuple(v['label'] for v in RELATION_MAP.values())
+
+def tree_sheets(depth, per_sheet=TREE_GENERATIONS):
+    """家系図のシートを (最下段の番号, 層数) で返す。per_sheet 世代ごとに続きのシートへ分ける"""
+    sheets = []
+    for base in range(0, depth, per_sheet):
+        layers = min(per_sheet, depth - base)
+        sheets.extend((root, layers) for root in range(2 ** base, 2 ** (base + 1)))
+    return sheets
+
+def quad_page_count(depth):
+    """depth 世代分の4分割ページの枚数（1ページ4名）"""
+    return -(-(2 ** (depth + 1) - 1) // 4)
+
+# ClientRecord.flags のビット
+GUARDIAN = 1
+PRIORITY = 2
+
+class ClientRecord:
+    """1人分の入力データ。名前と属性は番号（本人=1）を添字とする配列で持つ
+
+    names[n] は番号 n の人物の名前（未入力は None）、flags[n] は GUARDIAN / PRIORITY のビット。
+    世代・性別・ラベルは番号から決まるので持たない。関係表にない見出しの名前は other_names に残す。
+    guardians / priorities / contracts は記録ページに載せる入力そのままの文字列。
+    """
+    __slots__ = ('names', 'flags', 'other_names', 'guardians', 'priorities', 'contracts')
+
+    def __init__(self, names=(), flags=b'', other_names=(), guardians=(), priorities=(), contracts=()):
+        self.names = tuple(names)
+        self.flags = bytes(flags)
+        self.other_names = tuple(other_names)
+        self.guardians = tuple(guardians)
+        self.priorities = tuple(priorities)
+        self.contracts = tuple(contracts)
+
+    def __reduce__(self):
+        # プロセス間で渡すときは配列をそのまま送る
+        return ClientRecord, (self.names, self.flags, self.other_names,
+                              self.guardians, self.priorities, self.contracts)
+
+    @classmethod
+    def from_dict(cls, data):
+        """{'names': {関係キーかラベル: 名前}, 'guardians': [...], 'priorities': [...], 'contracts': [...]} から作る
+
+        JSON から読んだ値をそのまま受けるので、形が違えば TypeError にする。
+        """
+        from .parser import _ClientBuilder # parser はこのモジュールを読み込むので、使うときに読む
+        names = data.get('names', {})
+        if not (isinstance(names, dict) and all(isinstance(k, str) and isinstance(v, str) for k, v in names.items())):
+            raise TypeError("names は {関係: 名前} の形（どちらも文字列）で指定してください")
+        builder = _ClientBuilder()
+        for key, name in names.items():
+            builder.add_name(key, name)
+        for section in ('guardians', 'priorities', 'contracts'):
+            items = data.get(section, [])
+            if not (isinstance(items, list) and all(isinstance(item, str) for item in items)):
+                raise TypeError(f"{section} は文字列のリストで指定してください")
+            for item in items:
+                builder.add_item(section, item)
+        return builder.build()
+
+    def to_dict(self):
+        """from_dict で読める形（JSON にできる）"""
+        names = {RELATION_KEYS[n]: name for n, name in enumerate(self.names) if name is not None}
+        names.update(self.other_names)
+        return {'names': names, 'guardians': list(self.guardians),
+                'priorities': list(self.priorities), 'contracts': list(self.contracts)}
+
+    def name(self, n):
+        """番号 n の人物の名前。未入力なら None"""
+        return self.names[n] if n < len(self.names) else None
+
+    def flags_of(self, n):
+        """番号 n の人物の (守護, 優先順位)"""
+        bits = self.flags[n] if n < len(self.flags) else 0
+        return bool(bits & GUARDIAN), bool(bits & PRIORITY)
+
+    def has_data(self, n):
+        """番号 n の人物に名前か属性の入力があるか"""
+        return n < len(self.names) and (self.names[n] is not None or self.flags[n] != 0)
+
+    @property
+    def depth(self):
+        """名前・属性の入力に現れる最も古い世代（最低 TREE_GENERATIONS 世代）"""
+        return max(TREE_GENERATIONS, (len(self.names) - 1).bit_length() - 1)
+
+def client_display_name(client_data):
+    return client_data.name(1) or 'Client'
+
+def pdf_file_name(client_name, date=None):
+    date = date or datetime.datetime.now()
+    return f"{client_name}さん_{date.strftime('%Y%m%d')}.pdf"
+
+def unique_path(out_dir, file_name, used):
+    """同名・同日のクライアントが重ならないよう連番を付ける"""
+    stem, ext = os.path.splitext(file_name)
+    candidate, i = file_name, 2
+    while candidate in used:
+        candidate = f"{stem}_{i}{ext}"
+        i += 1
+    used.add(candidate)
+    return os.path.join(out_dir, candidate)
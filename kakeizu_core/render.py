@@ -0,0 +1,546 @@
+"""PDFの描画（ReportLab）
+
+パッケージの他の部分と違い、読み込むと ReportLab の描画部分も読み込まれる。
+"""
+import functools
+import hashlib
+from contextlib import nullcontext
+
+from reportlab.lib import colors
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from .fonts import get_font_registry
+from .layout import sheet_generations, tree_layout_config, tree_legend, tree_node_style, tree_sheet_layout
+from .records import RELATION_LABELS, client_display_name, tree_sheets
+from .settings import (
+    FONT_NAME,
+    FONT_SIZE_BG,
+    FONT_SIZE_QUAD_NAME,
+    FONT_SIZE_SUMMARY,
+    FONT_SIZE_TREE,
+    NO_LINE_START,
+    PDF_INVARIANT,
+    QUAD_PARALLEL_MIN_PAGES,
+    QUAD_RANGE_PAGES,
+    SUMMARY_LIST_ROWS,
+    VOLUME_TOC_ROWS,
+)
+
+@functools.lru_cache(maxsize=4096)
+def char_width(char):
+    """1文字の 1pt あたりの幅。折り返しのたびに測り直さないよう覚えておく"""
+    return pdfmetrics.stringWidth(char, FONT_NAME, 1)
+
+def wrap_text(text, max_width, size):
+    """text を幅 max_width に収まる行に分ける（日本語は単語の区切りがないので1文字単位で折る）
+
+    句読点・閉じ括弧は行頭に来ないよう、前の行にはみ出させる。
+    """
+    lines = []
+    start = 0
+    width = 0.0
+    for i, char in enumerate(text):
+        w = char_width(char) * size
+        if width + w > max_width and i > start and char not in NO_LINE_START:
+            lines.append(text[start:i])
+            start, width = i, 0.0
+        width += w
+    lines.append(text[start:])
+    return lines
+
+def copy_font_state(doc):
+    """文書 doc での文字コードの割り当て (assignments, subsets, nextCode) の写し"""
+    state = pdfmetrics.getFont(FONT_NAME).state[doc]
+    return dict(state.assignments), [list(subset) for subset in state.subsets], state.nextCode
+
+def restore_font_state(doc, font_state):
+    """copy_font_state の写しを文書 doc の割り当てとして設定し、その状態を返す"""
+    font = pdfmetrics.getFont(FONT_NAME)
+    assignments, subsets, next_code = font_state
+    state = TTFont.State(font._asciiReadable, font)
+    state.assignments = dict(assignments)
+    state.subsets = [list(subset) for subset in subsets]
+    state.nextCode = next_code
+    font.state[doc] = state
+    return state
+
+class GenealogyPDF:
+    def __init__(self, client_data, file_object, instrument=None, page_size=None, shared_canvas=None, page_cache=None,
+                 pool=None):
+        """client_data は ClientRecord。shared_canvas を渡すと、そのキャンバス（複数クライアントをまとめた冊子など）に続けて描く
+
+        page_cache（PageCache）を渡すと、前回と入力が同じページは描かずに記録を再生する。
+        pool（ProcessPoolExecutor など）を渡すと、4分割ページが多いときはページ範囲ごとにワーカーで描く。
+        """
+        self.layout = tree_layout_config(page_size)
+        self.c = shared_canvas or canvas.Canvas(file_object, pagesize=self.layout.page_size, invariant=PDF_INVARIANT)
+        self.width, self.height = self.layout.page_size
+        self.data = client_data
+        self.file_object = file_object
+        self.instrument = instrument
+        self.page_cache = page_cache if shared_canvas is None else None
+        self.pool = pool
+        # 描いたページの (描画命令, 使ったフォーム)。ページを再生に使うときだけ記録する
+        self._page_log = [] if self.page_cache is not None else None
+        self._page_forms = [] # 現在のページで使った背景フォームの (名前, 幅)
+        self._define_forms = True # False なら背景フォームは名前だけ使い、定義は記録を再生する文書に任せる
+        
+        with self.measure('font'):
+            get_font_registry().ensure()
+        if self.page_cache is not None:
+            self.page_cache.attach(self.c, self.layout.page_size)
+        self.depth = client_data.depth
+
+    def measure(self, stage):
+        """計測が有効なら stage の段階として計測する"""
+        if self.instrument is None:
+            return nullcontext()
+        return self.instrument.stage(stage, self.file_object)
+
+    def _show_page(self):
+        page = self.c.getPageNumber()
+        if self._page_log is not None:
+            self._page_log.append((list(self.c._code), self._page_forms))
+        self._page_forms = []
+        self.c.showPage()
+        if self.instrument is not None:
+            self.instrument.page_done(page)
+
+    def check_attributes(self, n):
+        """番号 n の人物の (守護, 優先順位)"""
+        return self.data.flags_of(n)
+
+    def _draw_unit(self, unit, draw, *args):
+        """draw(*args) で1ページ以上を描く。unit はそのページが使うデータだけを並べた組で、
+        page_cache に同じ unit の記録があれば描かずに再生する"""
+        if self.page_cache is None:
+            draw(*args)
+            return
+        pages = self.page_cache.get(unit)
+        if pages is None:
+            start = len(self._page_log)
+            draw(*args)
+            self.page_cache.put(unit, self._page_log[start:])
+            return
+        self._replay(pages)
+
+    def _replay(self, pages):
+        """記録したページ（描画命令, 使ったフォーム）をこの文書のページとして書き出す"""
+        for code, forms in pages:
+            # 先にフォームを定義してから、このページで使うフォームとして登録する
+            # （描画命令が空のページでフォームを定義すると、ページ側の登録が消えるため）
+            form_names = [self._background_form(name, width) for name, width in forms]
+            self.c._formsinuse.extend(form_names)
+            self.c._code.extend(code)
+            self._show_page()
+
+    def _person_unit(self, n):
+        return n, self.data.name(n), self.check_attributes(n)
+
+    def draw_vertical_text(self, text, x, y, size, is_bold=False, is_guardian=False):
+        self.c.saveState()
+        char_height = size * 1.05
+        total_height = len(text) * char_height
+        start_y = y + (total_height / 2)
+        
+        if is_guardian:
+            line_x = x - (size * 0.8)
+            line_top = start_y + (size * 0.2)
+            line_bottom = start_y - total_height - (size * 0.2)
+            self.c.setLineWidth(0.5)
+            self.c.setStrokeColor(colors.black)
+            self.c.line(line_x, line_top, line_x, line_bottom)
+
+        # 1名につきテキストオブジェクトは1つ。1文字ごとに行送り(T*)で下へ進める
+        t_obj = self.c.beginText()
+        t_obj.setFont(FONT_NAME, size, leading=char_height)
+        t_obj.setTextOrigin(x - (size/2), start_y - size)
+        
+        if is_bold:
+            t_obj.setTextRenderMode(2) # 太字
+            self.c.setLineWidth(0.5)
+            self.c.setStrokeColor(colors.black)
+        else:
+            t_obj.setTextRenderMode(0) # 通常
+            self.c.setFillColor(colors.black)
+        
+        for char in text:
+            t_obj.textLine(char)
+        self.c.drawText(t_obj)
+        self.c.restoreState()
+
+    def create_tree_page(self):
+        """家系図ページ。1枚に収まらない世代は続きのシートに分けて描く"""
+        for root, layers in tree_sheets(self.depth, sheet_generations(self.layout)):
+            if root != 1 and not self._has_ancestor_data(root, layers):
+                continue
+            people = tuple(self._person_unit(n)
+                           for gen in range(layers + 1) for n in range(root << gen, (root + 1) << gen))
+            self._draw_unit(('tree', root, layers, people), self._draw_tree_sheet, root, layers)
+
+    def _has_ancestor_data(self, root, layers):
+        """root より上の layers 世代に、名前か属性の入力があるか"""
+        for gen in range(1, layers + 1):
+            for n in range(root << gen, (root + 1) << gen):
+                if self.data.has_data(n):
+                    return True
+        return False
+
+    def _draw_tree_sheet(self, root, layers):
+        """番号 root の人物を最下段に、その先祖 layers 世代分を1枚に描く"""
+        config = self.layout
+        
+        # 凡例
+        self.c.saveState()
+        self.c.setFont(FONT_NAME, 10)
+        self.c.setFillColor(colors.black)
+        legend_x = config.margin_x
+        legend_y = self.height - 15 * mm
+        for row, line in enumerate(tree_legend(root)):
+            self.c.drawString(legend_x, legend_y - row * 6*mm, line)
+        self.c.restoreState()
+
+        # 座標は設定ごとに計算済みの表から取り、ここでは描くだけ
+        nodes, segments = tree_sheet_layout(layers, config)
+        
+        self.c.saveState()
+        self.c.setLineWidth(0.6) 
+        self.c.setStrokeColor(colors.black)
+        self.c.setDash([]) 
+        self.c.lines(segments)
+        self.c.restoreState()
+        
+        for layer, i, x, y in nodes:
+            self._draw_node((root << layer) + i, x, y, config.box_w, config.box_h)
+        self._show_page()
+
+    def _draw_node(self, n, x, y, box_w, box_h):
+        name, gender, is_guardian, is_priority = tree_node_style(n, self.data)
+
+        self.c.saveState()
+        self.c.setLineWidth(0.6)
+        self.c.setStrokeColor(colors.black) 
+        self.c.setFillColor(colors.white)
+        if gender == 'f':
+            self.c.ellipse(x - box_w/2, y - box_h/2, x + box_w/2, y + box_h/2, fill=1, stroke=1)
+        else:
+            self.c.rect(x - box_w/2, y - box_h/2, box_w, box_h, fill=1, stroke=1)
+        self.c.restoreState()
+        self.draw_vertical_text(name, x, y, FONT_SIZE_TREE, is_priority, is_guardian)
+
+    def create_quad_pages(self):
+        targets = []
+        targets.append((1, self.data.name(1) or '本人'))
+        for n in range(2, 2 ** (self.depth + 1)):
+            targets.append((n, self.data.name(n) or RELATION_LABELS[n]))
+        batches = [targets[i:i+4] for i in range(0, len(targets), 4)]
+        units = [('quad', tuple((n, name, self.check_attributes(n)) for n, name in batch)) for batch in batches]
+        
+        rendered = {}
+        if self.pool is not None and len(batches) >= QUAD_PARALLEL_MIN_PAGES:
+            todo = [i for i, unit in enumerate(units) if self.page_cache is None or unit not in self.page_cache]
+            pages = self._render_quad_ranges([batches[i] for i in todo])
+            rendered = {units[i]: [page] for i, page in zip(todo, pages)}
+        for unit, batch in zip(units, batches):
+            pages = rendered.get(unit)
+            if pages is None:
+                self._draw_unit(unit, self._draw_quad_page, batch)
+                continue
+            self._replay(pages)
+            if self.page_cache is not None:
+                self.page_cache.put(unit, pages)
+
+    def _render_quad_ranges(self, batches):
+        """4分割ページ（batches の1件が1ページ）を QUAD_RANGE_PAGES ページずつ pool のワーカーに描かせ、
+        ページの記録を順に並べて返す
+
+        文字コードは文書ごとに使われた順に割り当てられるので、先にこの文書で1ページ目から順に
+        全員の名前を割り当ててから配る。ワーカーはその割り当てのまま描くだけなので、出力は
+        1つのキャンバスに順に描いたときと1バイトも変わらない。
+        """
+        font = pdfmetrics.getFont(FONT_NAME)
+        doc = self.c._doc
+        for batch in batches:
+            for n, name in batch:
+                font.splitString(name + "　", doc) # 背景の文字列と同じ順
+        font.getSubsetInternalName(0, doc)
+        font_state = copy_font_state(doc)
+        internal_name = font.state[doc].internalName
+        futures = [self.pool.submit(_render_quad_range, self.data, self.layout.page_size, font_state, internal_name,
+                                    batches[i:i + QUAD_RANGE_PAGES])
+                   for i in range(0, len(batches), QUAD_RANGE_PAGES)]
+        return [page for future in futures for page in future.result()]
+
+    def _draw_quad_page(self, people):
+        w, h = self.width, self.height
+        cx, cy = w/2, h/2
+        
+        self.c.saveState()
+        self.c.setLineWidth(1.5) 
+        self.c.setStrokeColor(colors.black)
+        self.c.setDash([]) 
+        self.c.line(cx, 0, cx, h)
+        self.c.line(0, cy, w, cy)
+        self.c.restoreState()
+        
+        rects = [(0, cy, cx, cy), (cx, cy, cx, cy), (0, 0, cx, cy), (cx, 0, cx, cy)]
+        
+        for idx, (n, name) in enumerate(people):
+            if idx >= 4: break
+            rx, ry, rw, rh = rects[idx]
+            
+            # ■ 修正：背景転写（完全な白）
+            # 1行分をフォームXObjectとして一度だけ作り、12ptごとに参照して敷き詰める
+            form_name = self._background_form(name, rw)
+            self.c.saveState()
+            path = self.c.beginPath()
+            path.rect(rx, ry, rw, rh)
+            self.c.clipPath(path, stroke=0, fill=0)
+            self.c.translate(rx, ry + rh)
+            ty = ry + rh
+            while ty > ry:
+                self.c.doForm(form_name)
+                self.c.translate(0, -12)
+                ty -= 12
+            self.c.restoreState()
+            
+            # 中央表示
+            is_guardian, is_priority = self.check_attributes(n)
+
+            center_x = rx + rw/2
+            center_y = ry + rh/2
+            self.c.setFillColor(colors.black)
+            
+            t_obj = self.c.beginText()
+            t_obj.setFont(FONT_NAME, FONT_SIZE_QUAD_NAME)
+            
+            if is_priority:
+                t_obj.setTextRenderMode(2) 
+                self.c.setLineWidth(1.5)
+                self.c.setStrokeColor(colors.black)
+            else:
+                t_obj.setTextRenderMode(0) 
+
+            text_width = self.c.stringWidth(name, FONT_NAME, FONT_SIZE_QUAD_NAME)
+            text_start_x = center_x - text_width/2
+            t_obj.setTextOrigin(text_start_x, center_y)
+            t_obj.textOut(name)
+            self.c.drawText(t_obj)
+            
+            if is_guardian:
+                self.c.setLineWidth(1.2)
+                self.c.setStrokeColor(colors.black)
+                underline_y = center_y - (FONT_SIZE_QUAD_NAME * 0.25)
+                self.c.line(text_start_x, underline_y, text_start_x + text_width, underline_y)
+
+        self._show_page()
+
+    def _background_form(self, name, width):
+        """名前を並べた背景1行分のフォームXObjectを返す。文書内で名前ごとに1つだけ作る"""
+        form_name = "bg" + hashlib.sha1(f"{name}:{width}".encode('utf-8')).hexdigest()[:10]
+        self._page_forms.append((name, width))
+        if not self._define_forms or self.c.hasForm(form_name):
+            return form_name
+        self.c.beginForm(form_name, 0, -FONT_SIZE_BG * 0.4, width, FONT_SIZE_BG * 1.2)
+        bg_t = self.c.beginText()
+        bg_t.setFont(FONT_NAME, FONT_SIZE_BG)
+        bg_t.setFillColor(colors.white) # 文字色：白
+        bg_t.setStrokeColor(colors.white) # 線色：白
+        bg_t.setTextRenderMode(0) 
+        bg_t.setTextOrigin(0, 0)
+        bg_t.textOut((name + "　") * 10)
+        self.c.drawText(bg_t)
+        self.c.endForm()
+        return form_name
+
+    def create_summary_page(self):
+        unit = ('summary', self.data.guardians, self.data.priorities, self.data.contracts)
+        self._draw_unit(unit, self._draw_summary_pages)
+
+    def _draw_summary_pages(self):
+        """
+        上段：守護・優先順位 (2列表示)
+        下段：契約・コード (全幅表示)
+        長い項目は折り返し、収まらない分は次のページに続ける
+        """
+        x_base = 20 * mm
+        y_top = self.height - 30 * mm
+        line_height = 6 * mm
+        
+        # --- レイアウト設定 ---
+        page_width = self.width - (x_base * 2)
+        # ■ 修正：上段と下段の間に十分な余白を確保
+        y_mid = self.height / 2 - 50 * mm # 元より30mm下に下げる
+        
+        col_width_half = page_width / 2 - 5 * mm
+        x_guardians = x_base
+        x_priorities = x_base + page_width / 2 + 5 * mm
+        
+        y_start_upper = y_top - 15 * mm
+        
+        # 上段：どちらかの一覧が収まらなければ、残りを次のページの上段に続ける
+        guardian_pages = self._summary_columns(self.data.guardians, col_width_half)
+        priority_pages = self._summary_columns(self.data.priorities, col_width_half)
+        for page in range(max(len(guardian_pages), len(priority_pages))):
+            if page > 0:
+                self._show_page()
+            self._draw_summary_title(x_base, y_top, page > 0)
+            for title, pages, start_x in (("◎ 守護存在", guardian_pages, x_guardians),
+                                          ("◎ 癒す優先順位", priority_pages, x_priorities)):
+                if page >= len(pages):
+                    continue
+                self.c.setFont(FONT_NAME, 12)
+                self.c.setFillColor(colors.black)
+                self.c.drawString(start_x, y_start_upper, title + ("（続き）" if page > 0 else ""))
+                self.c.setFont(FONT_NAME, 10)
+                for col, row, continued, line in pages[page]:
+                    tx = start_x + (col * col_width_half / 2) + 2 * mm
+                    ty = y_start_upper - 8 * mm - (row * line_height)
+                    self._draw_summary_line(tx, ty, line, continued)
+        
+        # 下段：上段の最後のページから書き始め、下端まで来たら次のページの上から続ける
+        self.c.setFont(FONT_NAME, 12)
+        self.c.drawString(x_base, y_mid, "◎ 契約・コード")
+        y = y_mid - 8 * mm
+        self.c.setFont(FONT_NAME, 10)
+        text_width = page_width - 2 * mm - self._bullet_width()
+        for item in self.data.contracts:
+            for k, line in enumerate(wrap_text(item, text_width, FONT_SIZE_SUMMARY)):
+                if y < 20 * mm:
+                    self._show_page()
+                    self._draw_summary_title(x_base, y_top, True)
+                    self.c.setFont(FONT_NAME, 12)
+                    self.c.drawString(x_base, y_start_upper, "◎ 契約・コード（続き）")
+                    y = y_start_upper - 8 * mm
+                    self.c.setFont(FONT_NAME, 10)
+                self._draw_summary_line(x_base + 2*mm, y, line, k > 0)
+                y -= line_height
+
+        self._show_page()
+
+    def _draw_summary_title(self, x, y, continued=False):
+        self.c.setFont(FONT_NAME, 14)
+        self.c.drawString(x, y, "■ 記録・解析（続き）" if continued else "■ 記録・解析")
+
+    def _draw_summary_line(self, x, y, line, continued=False):
+        """箇条書きの1行。折り返した2行目以降は「・」の幅だけ字下げする"""
+        if continued:
+            self.c.drawString(x + self._bullet_width(), y, line)
+        else:
+            self.c.drawString(x, y, f"・{line}")
+
+    def _bullet_width(self):
+        return char_width("・") * FONT_SIZE_SUMMARY
+
+    def _summary_columns(self, items, width):
+        """一覧を幅 width の2列に折り返して並べ、ページごとの [(列, 行, 折り返しの続きか, 文字列)] にする"""
+        text_width = width / 2 - 2 * mm - self._bullet_width()
+        pages = [[]]
+        col = row = 0
+        for item in items:
+            lines = wrap_text(item, text_width, FONT_SIZE_SUMMARY)
+            # 1項目は列をまたがないように、入りきらなければ次の列から書く（1列より長い項目は分ける）
+            if row and row + len(lines) > SUMMARY_LIST_ROWS:
+                col, row = col + 1, 0
+            for k, line in enumerate(lines):
+                if row == SUMMARY_LIST_ROWS:
+                    col, row = col + 1, 0
+                if col == 2:
+                    pages.append([])
+                    col = 0
+                pages[-1].append((col, row, k > 0, line))
+                row += 1
+        return pages
+
+    def save(self):
+        if self.page_cache is not None:
+            self.page_cache.detach(self.c)
+        self.c.save()
+
+def _render_quad_range(client_data, page_size, font_state, internal_name, batches):
+    """ワーカー側：文字コードの割り当てを引き継いだ使い捨ての文書に4分割ページを描き、ページの記録を返す"""
+    gen = GenealogyPDF(client_data, None, page_size=page_size)
+    state = restore_font_state(gen.c._doc, font_state)
+    state.internalName = internal_name
+    gen._page_log = []
+    gen._define_forms = False
+    for batch in batches:
+        gen._draw_quad_page(batch)
+    if state.nextCode != font_state[2]:
+        raise RuntimeError("4分割ページに割り当て済みでない文字があります")
+    return gen._page_log
+
+def render_pdf(client_data, file_object, instrument=None, page_cache=None, pool=None):
+    """家系図・4分割・記録の全ページを file_object に書き出す"""
+    gen = GenealogyPDF(client_data, file_object, instrument, page_cache=page_cache, pool=pool)
+    with gen.measure('create_tree_page'):
+        gen.create_tree_page()
+    with gen.measure('create_quad_pages'):
+        gen.create_quad_pages()
+    with gen.measure('create_summary_page'):
+        gen.create_summary_page()
+    with gen.measure('save'):
+        gen.save()
+
+def render_volume(clients, file_object, total, page_size=None):
+    """複数クライアントを1冊のPDFにまとめる。先頭に目次、クライアントごとにしおりを付ける
+
+    clients は client_data を1件ずつ返すイテラブル（一度に全件を読み込む必要はない）。
+    フォントは冊子全体で1度だけ埋め込まれる。total は目次のページ数を決めるための件数で、
+    目次に入りきらない人数が来たら ValueError にする（目次を黙って切り詰めない）。
+    """
+    layout = tree_layout_config(page_size)
+    c = canvas.Canvas(file_object, pagesize=layout.page_size, invariant=PDF_INVARIANT)
+    c.setTitle("家系図")
+    get_font_registry().ensure()
+    
+    # 目次は全員分を描き終えるまでページ番号が分からないので、先にページだけ確保して
+    # フォームXObjectを参照しておき、中身は最後に定義する
+    toc_pages = max(1, -(-total // VOLUME_TOC_ROWS))
+    c.bookmarkPage('toc')
+    c.addOutlineEntry("目次", 'toc', level=0)
+    for i in range(toc_pages):
+        c.doForm(f"toc{i}")
+        c.showPage()
+    
+    entries = []
+    for i, client_data in enumerate(clients):
+        if i >= toc_pages * VOLUME_TOC_ROWS:
+            raise ValueError(f"目次は{total}件分しか確保していませんが、{i + 1}件目が来ました")
+        client_name = client_display_name(client_data)
+        entries.append((client_name, c.getPageNumber()))
+        gen = GenealogyPDF(client_data, None, page_size=layout.page_size, shared_canvas=c)
+        c.bookmarkPage(f"c{i}")
+        c.addOutlineEntry(f"{client_name}さん", f"c{i}", level=0, closed=True)
+        c.bookmarkPage(f"c{i}t")
+        c.addOutlineEntry("家系図", f"c{i}t", level=1)
+        gen.create_tree_page()
+        c.bookmarkPage(f"c{i}q")
+        c.addOutlineEntry("4分割", f"c{i}q", level=1)
+        gen.create_quad_pages()
+        c.bookmarkPage(f"c{i}s")
+        c.addOutlineEntry("記録・解析", f"c{i}s", level=1)
+        gen.create_summary_page()
+    
+    width, height = layout.page_size
+    for page in range(toc_pages):
+        c.beginForm(f"toc{page}")
+        c.setFillColor(colors.black)
+        y = height - 25 * mm
+        if page == 0:
+            c.setFont(FONT_NAME, 16)
+            c.drawString(20 * mm, y, f"目次（{len(entries)}件）")
+        y -= 12 * mm
+        c.setFont(FONT_NAME, 11)
+        first = page * VOLUME_TOC_ROWS
+        for number, (client_name, start_page) in enumerate(entries[first:first + VOLUME_TOC_ROWS], first + 1):
+            c.drawString(25 * mm, y, f"{number}. {client_name}さん")
+            c.drawRightString(width - 25 * mm, y, f"{start_page}")
+            y -= (height - 50 * mm) / VOLUME_TOC_ROWS
+        c.endForm()
+    c.showOutline()
+    c.save()
+    return len(entries)
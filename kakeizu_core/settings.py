@@ -0,0 +1,40 @@
+"""家系図PDFの設定値"""
+
+# ※フォントファイル名は実際のファイルに合わせて変更してください
+FONT_NAME = "IPAMincho"
+FONT_FILE = "ipam.ttf"
+FONT_FALLBACK_FILE = "ipaexm.ttf"
+
+# 描画内容を変えたら上げる（生成済みPDFのキャッシュが無効になる）
+RENDERER_VERSION = "3"
+
+# 同じ入力からは常に同じバイト列のPDFを作る（作成日時・文書IDを入力だけから決める）
+PDF_INVARIANT = 1
+
+# 冊子（複数クライアントをまとめたPDF）の目次1ページあたりの行数
+VOLUME_TOC_ROWS = 30
+
+# 生成済みPDFのキャッシュ。ディスクにも残す場合は PDF_CACHE_DIR にフォルダ名を指定する
+# （PDF_CACHE_MAX_ITEM_BYTES を超える大きなPDFはメモリには置かない）
+PDF_CACHE_MEMORY_BYTES = 64 * 1024 * 1024
+PDF_CACHE_MAX_ITEM_BYTES = 8 * 1024 * 1024
+PDF_CACHE_DIR = None
+PDF_CACHE_DISK_BYTES = 500 * 1024 * 1024
+
+# 4分割ページをプロセスプールで分担して描くときの、ワーカー1回分のページ数と、分担を始めるページ数
+QUAD_RANGE_PAGES = 16
+QUAD_PARALLEL_MIN_PAGES = 32
+
+# 関係表を用意する最大世代（本人=0）と、家系図1枚に載せる世代数
+MAX_GENERATION = 10
+TREE_GENERATIONS = 4
+
+# フォントの大きさ（pt）
+FONT_SIZE_TREE = 7.5
+FONT_SIZE_QUAD_NAME = 36
+FONT_SIZE_BG = 10 
+FONT_SIZE_SUMMARY = 10
+
+# 記録ページの守護・優先順位の1列あたりの行数と、行頭に置かない文字
+SUMMARY_LIST_ROWS = 12
+NO_LINE_START = frozenset("、。，．・：；？！ー）」』】〕〉》”’")
@@ -0,0 +1,202 @@
+"""PDF生成のジョブキュー
+
+Streamlit のボタン処理から生成を切り離し、別プロセスのワーカーで実行する。
+submit() でジョブIDを受け取り、status() で段階・ページごとの進み具合を、
+fetch() で完成したPDFを取り出す。
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+import streamlit as st
+
+import kakeizu_core
+from kakeizu_core import Instrumentation, PageCache, get_font_registry, get_pdf_cache, init_render_worker
+
+# 同時に生成するプロセス数と、受け付けるジョブ（待ち＋実行中）の上限
+JOB_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+JOB_MAX_PENDING = JOB_WORKERS * 4
+# 完成したPDFを取り出せる時間（秒）
+JOB_RESULT_TTL = 600
+
+
+class JobQueueFull(RuntimeError):
+    """受付上限に達していて新しいジョブを受け付けられない"""
+
+
+# ==========================================
+# 1. ワーカープロセス側
+# ==========================================
+_progress_queue = None
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+    init_render_worker()
+
+def _run_job(job_id, client_data, out_path, measure, page_cache=None):
+    instrument = Instrumentation(trace_memory=measure)
+    instrument.subscribe(lambda record: _progress_queue.put((job_id, record)))
+    fonts = get_font_registry()
+    if measure and fonts.load_seconds is not None:
+        # フォントはワーカーの起動時に一度だけ読み込むので、そのときの時間を載せる
+        instrument.add('font_load', fonts.load_seconds)
+    page_cache = page_cache or PageCache()
+    with open(out_path, 'wb') as f:
+        kakeizu_core.render_pdf(client_data, f, instrument, page_cache)
+    return os.path.getsize(out_path), page_cache
+
+# ==========================================
+# 2. ジョブキュー
+# ==========================================
+class JobQueue:
+    """プロセスプールでPDFを生成するジョブキュー。進捗はワーカーからキュー経由で受け取る"""
+    def __init__(self, workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING, cache=None):
+        self.max_pending = max_pending
+        self.cache = cache
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._dir = tempfile.mkdtemp(prefix='kakeizu-jobs-')
+        self._workers = workers
+        # Streamlit のスレッドから fork しないよう spawn で起動する
+        self._context = multiprocessing.get_context('spawn')
+        self._progress = self._context.Queue()
+        self._pool = self._new_pool()
+        threading.Thread(target=self._listen, daemon=True).start()
+
+    def submit(self, client_data, measure=False, page_cache=None):
+        """ジョブを登録してジョブIDを返す。上限に達していれば JobQueueFull
+
+        生成が終わると status() の page_cache にこのPDFのページ記録（PageCache）が入る。
+        次の submit() にそれを渡すと、入力が変わらなかったページは描かずに再生する。
+        """
+        self._expire()
+        key = self.cache.key(client_data) if self.cache else None
+        job_id = uuid.uuid4().hex
+        job = {'state': 'queued', 'stage': None, 'page': None, 'records': [], 'error': None,
+               'key': key, 'path': None, 'page_cache': None, 'submitted': time.time(), 'finished': None}
+
+        cached = self.cache.open(key) if self.cache and not measure else None
+        if cached is not None:
+            cached.close()
+            job.update(state='done', finished=time.time())
+            with self._lock:
+                self._jobs[job_id] = job
+            return job_id
+
+        with self._lock:
+            active = sum(1 for j in self._jobs.values() if j['state'] in ('queued', 'running'))
+            if active >= self.max_pending:
+                raise JobQueueFull(f"生成待ちが上限（{self.max_pending}件）に達しています")
+            job['path'] = os.path.join(self._dir, f"{job_id}.pdf")
+            self._jobs[job_id] = job
+        pool = self._pool
+        try:
+            future = pool.submit(_run_job, job_id, client_data, job['path'], measure, page_cache)
+        except BrokenProcessPool:
+            # ワーカーが異常終了するとプールはもう受け付けないので、作り直して出し直す
+            try:
+                future = self._restart_pool(pool).submit(_run_job, job_id, client_data, job['path'],
+                                                         measure, page_cache)
+            except BaseException:
+                with self._lock:
+                    del self._jobs[job_id]
+                raise
+        future.add_done_callback(partial(self._finish, job_id))
+        return job_id
+
+    def status(self, job_id):
+        """ジョブの状態（state: queued/running/done/error と進捗）の写し。不明なIDは None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return dict(job, records=list(job['records']))
+
+    def fetch(self, job_id):
+        """完成したPDFを先頭から読めるファイルオブジェクトで返す。未完成・期限切れは None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['state'] != 'done':
+                return None
+            path, key = job['path'], job['key']
+        if path:
+            try:
+                return open(path, 'rb')
+            except FileNotFoundError:
+                pass
+        return self.cache.open(key, count=False) if self.cache else None
+
+    def stats(self):
+        with self._lock:
+            states = [j['state'] for j in self._jobs.values()]
+        return {state: states.count(state) for state in ('queued', 'running', 'done', 'error')}
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self._workers, mp_context=self._context,
+                                   initializer=_init_worker, initargs=(self._progress,))
+
+    def _restart_pool(self, broken):
+        """壊れたプールを新しいものに取り替えて返す（他のスレッドが取り替え済みならそれを返す）"""
+        with self._lock:
+            if self._pool is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._pool = self._new_pool()
+            return self._pool
+
+    def _listen(self):
+        while True:
+            job_id, record = self._progress.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                if job['state'] == 'queued':
+                    job['state'] = 'running'
+                job['stage'] = record['stage']
+                job['page'] = record['page'] or job['page']
+                job['records'].append(record)
+
+    def _finish(self, job_id, future):
+        error = future.exception()
+        with self._lock:
+            job = self._jobs[job_id]
+        if error is None and self.cache and job['key']:
+            with open(job['path'], 'rb') as f:
+                self.cache.put(job['key'], f)
+        with self._lock:
+            job['finished'] = time.time()
+            if error is None:
+                job['state'] = 'done'
+                job['page_cache'] = future.result()[1]
+            else:
+                job['state'] = 'error'
+                job['error'] = str(error)
+
+    def _expire(self):
+        """期限切れのジョブと、その出力ファイルを片付ける"""
+        limit = time.time() - JOB_RESULT_TTL
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job['finished'] and job['finished'] < limit]
+            paths = [self._jobs.pop(job_id)['path'] for job_id in expired]
+        for path in paths:
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+
+@st.cache_resource
+def get_job_queue():
+    """全セッション共通のジョブキュー"""
+    return JobQueue(cache=get_pdf_cache())
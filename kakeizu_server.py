@@ -0,0 +1,298 @@
+"""家系図PDFのローカルHTTPサービス
+
+    python kakeizu_server.py --port 8502 -j 4
+
+  POST /pdf       本文がテキスト（入力欄と同じ形式）か JSON → PDF
+                  JSON は {"text": "..."} か、解析済みの {"names": {...}, "guardians": [...], ...}
+  POST /pdf/zip   JSON {"clients": [{"id": "...", "text": "..."}, ...]} → 各クライアントのPDFを入れたZIP
+  GET  /health    ワーカー数・フォント・キャッシュの状態（JSON）
+
+ワーカーは起動時にまとめて立ち上げてフォントを読み込んでおくため、各リクエストは描画の時間だけで済む。
+世代の深い1人分は、4分割ページをページ範囲ごとに全ワーカーで分担して描く。
+PDF・ZIPはメモリに丸ごと溜めず、一時ファイル（小さいうちはメモリ）に書いてから応答に流す。
+HTTP/1.1 の keep-alive に対応し、外部への通信は行わない。
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote
+
+from kakeizu_core import (
+    ClientRecord,
+    PDFCache,
+    QUAD_PARALLEL_MIN_PAGES,
+    client_display_name,
+    get_font_registry,
+    init_render_worker,
+    parse_text_data,
+    pdf_file_name,
+    quad_page_count,
+    render_pdf,
+    unique_path,
+)
+
+# 受け付けるリクエスト本文の上限と、同時に処理するリクエスト数の上限（超えたら 503）
+MAX_BODY_BYTES = 16 * 1024 * 1024
+MAX_PENDING_REQUESTS = 64
+# 応答を組み立てる一時ファイルは、このサイズまではメモリに置く
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# ==========================================
+# 1. ワーカー処理
+# ==========================================
+def _warm_up():
+    return os.getpid()
+
+def _render_file(client_data, out_path):
+    # PDFはプロセス間で受け渡さず、親が決めたファイルに直接書く
+    with open(out_path, 'wb') as f:
+        render_pdf(client_data, f)
+
+def client_data_from_json(obj):
+    """JSON のクライアント1件を parse_text_data と同じ ClientRecord にする"""
+    if not isinstance(obj, dict):
+        raise TypeError(f"クライアントは JSON オブジェクトで送ってください（{type(obj).__name__} が来ました）")
+    if 'text' in obj:
+        if not isinstance(obj['text'], str):
+            raise TypeError("text は文字列で指定してください")
+        return parse_text_data(obj['text'])
+    return ClientRecord.from_dict(obj)
+
+# ==========================================
+# 2. 描画サービス
+# ==========================================
+class RenderService:
+    """起動済みのプロセスプールとPDFキャッシュをまとめたもの"""
+    def __init__(self, workers):
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=init_render_worker)
+        self.cache = PDFCache()
+        self._dir = tempfile.mkdtemp(prefix='kakeizu-server-')
+        self.slots = threading.BoundedSemaphore(MAX_PENDING_REQUESTS)
+        self.started = time.time()
+
+    def warm_up(self):
+        """全ワーカーを起動してフォントを読み込ませておく"""
+        wait([self.pool.submit(_warm_up) for _ in range(self.workers)])
+        get_font_registry().ensure() # キャッシュのキー計算用
+
+    @contextmanager
+    def render(self, client_data):
+        """PDFを先頭から読めるファイルオブジェクトで貸し出す（抜けると閉じて一時ファイルも消す）"""
+        key = self.cache.key(client_data)
+        f = self.cache.open(key)
+        out_path = None
+        try:
+            if f is None:
+                if quad_page_count(client_data.depth) >= QUAD_PARALLEL_MIN_PAGES:
+                    # 4分割ページはワーカーで分担し、このスレッドは組み立てだけを行う
+                    f = spool_file()
+                    render_pdf(client_data, f, pool=self.pool)
+                else:
+                    out_path = self._temp_path()
+                    self.pool.submit(_render_file, client_data, out_path).result()
+                    f = open(out_path, 'rb')
+                self.cache.put(key, f)
+            yield f
+        finally:
+            if f is not None:
+                f.close()
+            _remove(out_path)
+
+    def render_many(self, clients):
+        """[(id, client_data)] を並列に描画し、(id, client_data, PDFのファイルオブジェクト) を順に返す
+
+        ファイルオブジェクトは次の1件を取り出す前に閉じる。
+        """
+        pending = []
+        for source_id, client_data in clients:
+            key = self.cache.key(client_data)
+            cached = self.cache.open(key)
+            if cached is not None:
+                pending.append((source_id, client_data, key, cached, None))
+            else:
+                out_path = self._temp_path()
+                future = self.pool.submit(_render_file, client_data, out_path)
+                pending.append((source_id, client_data, key, out_path, future))
+        try:
+            for source_id, client_data, key, source, future in pending:
+                if future is None:
+                    with source:
+                        yield source_id, client_data, source
+                    continue
+                future.result()
+                with open(source, 'rb') as f:
+                    self.cache.put(key, f)
+                    yield source_id, client_data, f
+        finally:
+            for _, _, _, source, future in pending:
+                if future is None:
+                    source.close()
+                    continue
+                if not future.cancel():
+                    wait([future]) # 書き終わる前に消さない
+                _remove(source)
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    def _temp_path(self):
+        fd, path = tempfile.mkstemp(suffix='.pdf', dir=self._dir)
+        os.close(fd)
+        return path
+
+    def health(self):
+        fonts = get_font_registry()
+        return {'workers': self.workers, 'font': fonts.path, 'font_load_seconds': fonts.load_seconds,
+                'uptime_seconds': round(time.time() - self.started, 1), 'cache': self.cache.stats()}
+
+def spool_file():
+    """SPOOL_MAX_BYTES を超えたら一時ファイルに切り替わる書き出し先"""
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+
+def _remove(path):
+    if path is None:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+# ==========================================
+# 3. HTTPハンドラ
+# ==========================================
+class RenderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive
+    service = None
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, self.service.health())
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path not in ('/pdf', '/pdf/zip'):
+            self._send_json(404, {'error': 'not found'})
+            return
+        length = self._content_length()
+        if length is None:
+            return
+        body = self.rfile.read(length)
+        if not self.service.slots.acquire(blocking=False):
+            self._send_json(503, {'error': 'server busy'})
+            return
+        try:
+            if self.path == '/pdf':
+                self._handle_pdf(body)
+            else:
+                self._handle_zip(body)
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {'error': f"入力を解析できません: {e}"})
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+        finally:
+            self.service.slots.release()
+
+    def _content_length(self):
+        """本文の長さを返す。使えない Content-Length なら応答を返して None にする
+
+        本文の終わりが分からないので、その接続は閉じる。
+        """
+        value = self.headers.get('Content-Length')
+        if value is None:
+            status, error = 411, 'Content-Length required'
+        elif not value.strip().isdigit():
+            status, error = 400, f"invalid Content-Length: {value!r}"
+        elif int(value) > MAX_BODY_BYTES:
+            status, error = 413, 'request body too large'
+        else:
+            return int(value)
+        self.close_connection = True
+        self._send_json(status, {'error': error})
+        return None
+
+    def _handle_pdf(self, body):
+        if 'json' in (self.headers.get('Content-Type') or ''):
+            client_data = client_data_from_json(json.loads(body))
+        else:
+            client_data = parse_text_data(body.decode('utf-8'))
+        with self.service.render(client_data) as pdf:
+            self._send_file(200, 'application/pdf', pdf, pdf_file_name(client_display_name(client_data)))
+
+    def _handle_zip(self, body):
+        request = json.loads(body)
+        clients = request['clients'] if isinstance(request, dict) else request
+        parsed = []
+        for i, c in enumerate(clients, 1):
+            client_data = client_data_from_json(c) # オブジェクトでなければここで TypeError
+            parsed.append((str(c.get('id', i)), client_data))
+        used_names = set()
+        with spool_file() as buffer:
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zf: # PDFは圧縮済み
+                for _, client_data, pdf in self.service.render_many(parsed):
+                    name = unique_path('', pdf_file_name(client_display_name(client_data)), used_names)
+                    with zf.open(name, 'w') as entry:
+                        shutil.copyfileobj(pdf, entry)
+            self._send_file(200, 'application/zip', buffer, f"kakeizu_{len(parsed)}件.zip")
+
+    def _send_json(self, status, obj):
+        self._send(status, 'application/json; charset=utf-8', json.dumps(obj, ensure_ascii=False).encode('utf-8'))
+
+    def _send(self, status, content_type, payload, file_name=None):
+        self._send_headers(status, content_type, len(payload), file_name)
+        self.wfile.write(payload)
+
+    def _send_file(self, status, content_type, file_object, file_name=None):
+        """file_object の中身を先頭から応答に流す（全体をメモリに読み込まない）"""
+        file_object.seek(0, os.SEEK_END)
+        size = file_object.tell()
+        file_object.seek(0)
+        self._send_headers(status, content_type, size, file_name)
+        shutil.copyfileobj(file_object, self.wfile)
+
+    def _send_headers(self, status, content_type, size, file_name):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(size))
+        if file_name:
+            self.send_header('Content-Disposition', f"attachment; filename*=UTF-8''{quote(file_name)}")
+        self.end_headers()
+
+# ==========================================
+# 4. メイン処理
+# ==========================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="家系図PDFのローカルHTTPサービス")
+    parser.add_argument('--host', default='127.0.0.1', help="待ち受けアドレス（既定: 127.0.0.1）")
+    parser.add_argument('--port', type=int, default=8502, help="待ち受けポート（既定: 8502）")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="ワーカープロセス数（既定: CPUコア数）")
+    args = parser.parse_args(argv)
+
+    service = RenderService(args.jobs)
+    service.warm_up()
+    RenderHandler.service = service
+    server = ThreadingHTTPServer((args.host, args.port), RenderHandler)
+    server.daemon_threads = True
+    print(f"http://{args.host}:{args.port} で待ち受けています（ワーカー {args.jobs}）", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
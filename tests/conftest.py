@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kakeizu_core import use_substitute_font  # noqa: E402
+
+
+@pytest.fixture(scope='session', autouse=True)
+def substitute_font():
+    """IPAフォントのない環境でも描画できるようにする"""
+    use_substitute_font()
@@ -0,0 +1,40 @@
+"""一括生成の入力読み込みと冊子の目次のテスト"""
+import io
+
+import pytest
+
+import kakeizu_core
+from kakeizu_batch import count_sources, iter_source_clients
+from kakeizu_core import VOLUME_TOC_ROWS, parse_text_data
+
+
+def test_broken_jsonl_lines_are_reported_and_skipped(tmp_path):
+    path = tmp_path / 'clients.jsonl'
+    path.write_text('\n'.join([
+        '{"id": "a", "text": "本人 = 山田 太郎\\n"}',
+        'not json',
+        '[1, 2]',
+        '{"id": "c"}',
+        '{"id": "d", "text": 5}',
+        '{"id": "e", "text": "本人 = 鈴木 花子\\n"}',
+    ]) + '\n', encoding='utf-8')
+    errors = []
+    ids = [source_id for source_id, _ in iter_source_clients(str(path), errors)]
+    assert ids == ['a', 'e']
+    assert [source_id for source_id, _ in errors] == ['clients.jsonl:2', 'clients.jsonl:3', 'c', 'd']
+
+
+def test_jsonl_records_with_several_clients_are_counted_per_client(tmp_path):
+    path = tmp_path / 'clients.jsonl'
+    path.write_text('\n'.join([
+        '{"id": "a", "text": "本人 = 山田 太郎\\n---\\n本人 = 山田 次郎\\n---\\n本人 = 山田 三郎\\n"}',
+        '{"id": "b", "text": "本人 = 鈴木 花子\\n"}',
+    ]) + '\n', encoding='utf-8')
+    assert count_sources(str(path)) == 4
+    assert len(list(iter_source_clients(str(path), []))) == 4
+
+
+def test_volume_rejects_more_clients_than_the_toc_holds():
+    clients = [parse_text_data(f"本人 = Name {n}\n") for n in range(VOLUME_TOC_ROWS + 1)]
+    with pytest.raises(ValueError):
+        kakeizu_core.render_volume(clients, io.BytesIO(), VOLUME_TOC_ROWS)
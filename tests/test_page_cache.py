@@ -0,0 +1,60 @@
+"""PageCache でページを再生した文書が、最初から描いた文書と同じ内容になることのテスト
+
+再生は ReportLab の内部（Canvas._code・TTFont.State など）に頼っているので、
+ReportLab を上げたときはまずこのテストで確かめる。
+"""
+import io
+
+import pytest
+
+from kakeizu_core import PageCache, ahnentafel_label, parse_text_data, render_pdf
+
+pypdf = pytest.importorskip('pypdf')
+from pypdf.generic import ContentStream  # noqa: E402
+
+
+def client_text(depth, edits=None):
+    # 代用フォント（Vera.ttf）には日本語の字形がないので、名前はラテン文字にする。
+    # ASCII の文字コードは順番によらず決まるので、使われた順に割り当てられるアクセント付きの文字を混ぜる
+    names = {n: f"Name {n} {chr(0xC0 + n % 24)}" for n in range(1, 2 ** (depth + 1))}
+    names.update(edits or {})
+    lines = [f"{ahnentafel_label(n)} = {name}" for n, name in names.items()]
+    lines += ["◎守護存在", "・父の母", "◎優先順位", "・母の父の父", "◎契約・コード", "・Contract A"]
+    return "\n".join(lines)
+
+
+def render(client_data, page_cache=None):
+    buffer = io.BytesIO()
+    render_pdf(client_data, buffer, page_cache=page_cache)
+    return pypdf.PdfReader(io.BytesIO(buffer.getvalue()))
+
+
+def check_resources(reader, obj, resources):
+    """obj の描画命令が使うフォント（Tf）とフォーム（Do）が resources に定義されているか。フォームの中も調べる"""
+    fonts = resources.get('/Font', {})
+    xobjects = resources.get('/XObject', {})
+    for operands, operator in ContentStream(obj.get_contents() if hasattr(obj, 'get_contents') else obj, reader).operations:
+        if operator == b'Tf':
+            assert operands[0] in fonts, f"未定義のフォント {operands[0]}"
+        elif operator == b'Do':
+            assert operands[0] in xobjects, f"未定義のフォーム {operands[0]}"
+            form = xobjects[operands[0]].get_object()
+            check_resources(reader, form, form.get('/Resources', {}))
+
+
+def test_replayed_document_matches_fresh_render():
+    depth = 5
+    page_cache = PageCache()
+    render(parse_text_data(client_text(depth)), page_cache)
+
+    # 家系図で最初に描かれる人物（最上段の右端）を、前回なかった文字（ë, ï）を含む名前に変える
+    edited = parse_text_data(client_text(depth, {16: "Zoë Loïc"}))
+    replayed = render(edited, page_cache)
+    assert page_cache.stats()['reused'] > 0
+    fresh = render(edited)
+
+    assert len(replayed.pages) == len(fresh.pages)
+    for number, (page, expected) in enumerate(zip(replayed.pages, fresh.pages), 1):
+        assert page.extract_text() == expected.extract_text(), f"{number}ページ目"
+        check_resources(replayed, page, page['/Resources'])
+    assert any("Zoë Loïc" in page.extract_text() for page in replayed.pages)
@@ -0,0 +1,54 @@
+"""描画結果が入力だけで決まることのテスト"""
+import io
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from kakeizu_core import (
+    QUAD_PARALLEL_MIN_PAGES,
+    ahnentafel_label,
+    parse_text_data,
+    quad_page_count,
+    render_pdf,
+    use_substitute_font,
+)
+
+
+def client_text(depth):
+    """depth 世代分の名前と、守護・優先順位・契約を持つ入力テキスト"""
+    people = range(1, 2 ** (depth + 1))
+    lines = [f"{ahnentafel_label(n)} = 山田{n}" for n in people]
+    lines.append("◎守護存在")
+    lines += [f"・{ahnentafel_label(n)}" for n in people if n % 3 == 0]
+    lines.append("◎優先順位")
+    lines += [f"・{ahnentafel_label(n)}" for n in people if n % 5 == 0]
+    lines.append("◎契約・コード")
+    lines += [f"・契約{i}「理由のない感情が突然出る」" for i in range(4)]
+    return "\n".join(lines)
+
+
+def render(client_data, **kwargs):
+    buffer = io.BytesIO()
+    render_pdf(client_data, buffer, **kwargs)
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope='module')
+def pool():
+    with ProcessPoolExecutor(max_workers=2, initializer=use_substitute_font) as pool:
+        yield pool
+
+
+@pytest.mark.parametrize('depth', [4, 7, 8])
+def test_repeated_renders_are_identical(depth):
+    data = parse_text_data(client_text(depth))
+    assert render(data) == render(data)
+
+
+@pytest.mark.parametrize('depth', [7, 8])
+def test_pool_render_matches_serial(depth, pool):
+    assert quad_page_count(depth) >= QUAD_PARALLEL_MIN_PAGES
+    data = parse_text_data(client_text(depth) + "\n母の母の母の母の母の母 = Émile Zoë")
+    serial = render(data)
+    assert render(data, pool=pool) == serial
+    assert render(data, pool=pool) == serial
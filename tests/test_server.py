@@ -0,0 +1,94 @@
+"""HTTPサービスの応答と、壊れたリクエストに 4xx を返すことのテスト"""
+import http.client
+import io
+import os
+import socket
+import threading
+import zipfile
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import kakeizu_server
+from kakeizu_core import ahnentafel_label, parse_text_data, render_pdf
+
+
+@pytest.fixture(scope='module')
+def port():
+    kakeizu_server.RenderHandler.service = kakeizu_server.RenderService(1)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), kakeizu_server.RenderHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1]
+    server.shutdown()
+    kakeizu_server.RenderHandler.service.shutdown()
+
+
+def raw_status(port, request):
+    with socket.create_connection(('127.0.0.1', port), timeout=5) as sock:
+        sock.sendall(request)
+        response = http.client.HTTPResponse(sock)
+        response.begin()
+        response.read() # 途中で切ると、書き込み中のサーバー側で ConnectionResetError が出る
+        return response.status
+
+
+def post(port, path, body, content_type='text/plain; charset=utf-8'):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        conn.request('POST', path, body, {'Content-Type': content_type})
+        response = conn.getresponse()
+        return response.status, response.read() # 読み残すとサーバー側で ConnectionResetError が出る
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('header, status', [
+    (b'Content-Length: abc\r\n', 400),
+    (b'Content-Length: -1\r\n', 400),
+    (b'', 411),
+])
+def test_unusable_content_length(port, header, status):
+    assert raw_status(port, b'POST /pdf HTTP/1.1\r\nHost: localhost\r\n' + header + b'\r\n') == status
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/pdf', b'[1, 2]'),
+    ('/pdf/zip', b'[1, 2]'),
+    ('/pdf/zip', b'{"clients": ["a"]}'),
+    ('/pdf', b'{"text": null}'),
+    ('/pdf', b'{"names": ["x"]}'),
+    ('/pdf', b'{"names": {"self": 5}}'),
+    ('/pdf', b'{"guardians": "abc"}'),
+    ('/pdf', b'{"contracts": [1]}'),
+    ('/pdf/zip', b'{"clients": [{"text": 5}]}'),
+])
+def test_json_that_is_not_an_object(port, path, body):
+    assert post(port, path, body, 'application/json')[0] == 400
+
+
+def expected_pdf(text):
+    buffer = io.BytesIO()
+    render_pdf(parse_text_data(text), buffer)
+    return buffer.getvalue()
+
+
+# 浅い木はワーカーで、深い木は4分割ページを分担してこのプロセスで組み立てる
+@pytest.mark.parametrize('text', [
+    "本人 = Taro\n父 = Ichiro\n",
+    f"本人 = Taro\n{ahnentafel_label(2 ** 7)} = Zoë\n",
+])
+def test_pdf_is_streamed_from_a_temporary_file(port, text):
+    expected = expected_pdf(text)
+    assert post(port, '/pdf', text.encode('utf-8')) == (200, expected)
+    assert post(port, '/pdf', text.encode('utf-8')) == (200, expected) # キャッシュから
+    assert os.listdir(kakeizu_server.RenderHandler.service._dir) == []
+
+
+def test_zip_contains_every_client(port):
+    body = '{"clients": [{"text": "本人 = Hanako\\n"}, {"text": "本人 = Hanako\\n母 = Yoko\\n"}]}'
+    status, payload = post(port, '/pdf/zip', body.encode('utf-8'), 'application/json')
+    assert status == 200
+    with zipfile.ZipFile(io.BytesIO(payload)) as zf:
+        pdfs = [zf.read(name) for name in zf.namelist()]
+    assert pdfs == [expected_pdf("本人 = Hanako\n"), expected_pdf("本人 = Hanako\n母 = Yoko\n")]
+    assert os.listdir(kakeizu_server.RenderHandler.service._dir) == []